@@ -10,6 +10,9 @@ import requests
 import json
 import os
 
+from worldbank_fetcher import make_session, get_json, fetch_indicator_page
+from http_cache import ResponseCache
+
 STATE_FILE = "last_update.json"
 
 POWER_INDICATORS = [
@@ -19,6 +22,10 @@ POWER_INDICATORS = [
 
 TEMP_URL = "https://cckpapi.worldbank.org/api/v1/cru-x0.5_timeseries_tas_timeseries_annual_1901-2024_mean_historical_cru_ts4.09_mean/PHL?_format=json"
 
+# Same cache as ETL_optimized.py, so the ETL triggered below reuses these downloads
+session = make_session()
+cache = ResponseCache()
+
 def get_latest_power_update():
     url = "https://data.gov.ph/index/public/resource/power-generation-by-fuel-source,-1990-2020/power-generation-by-fuel-source,-1990-2020/0okfrshp-s8xr-0ysb-xami-n8lhi22vxaxb"
 
@@ -52,12 +59,10 @@ def get_latest_world_power_update():
     """Get the most recent available year across all power indicators."""
     latest_year = None
     for ind in POWER_INDICATORS:
-        url = f"https://api.worldbank.org/v2/country/all/indicator/{ind}?format=json&per_page=1&page=1"
         try:
-            r = requests.get(url, timeout=10)
-            r.raise_for_status()
-            data = r.json()
-            year = int(data[1][0]["date"])
+            # Requests the exact page the ETL extracts first, so it is downloaded only once
+            _, records = fetch_indicator_page(session, ind, 1, per_page=1000, cache=cache)
+            year = int(records[0]["date"])
             if not latest_year or year > latest_year:
                 latest_year = year
         except (requests.exceptions.RequestException, KeyError, IndexError, ValueError) as e:
@@ -69,9 +74,7 @@ def get_latest_world_power_update():
 def get_latest_temp_update():
     """Get latest year from temperature dataset (uses 'PHL' keys like '2024-07')."""
     try:
-        r = requests.get(TEMP_URL, timeout=10)
-        r.raise_for_status()
-        data = r.json()
+        data = get_json(session, TEMP_URL, timeout=10, cache=cache)
         years = [int(k.split("-")[0]) for k in data["data"]["PHL"].keys()]
         return str(max(years))
     except (requests.exceptions.RequestException, ValueError, KeyError) as e:
@@ -1,10 +1,15 @@
-import csv
 import psycopg2
 import os
 import io
 import requests
 from dotenv import load_dotenv
 
+from worldbank_fetcher import make_session, get_json, fetch_indicators
+from http_cache import ResponseCache
+from key_resolver import KeyResolver
+from staging_loader import copy_rows, load_csv_sources, POWER_CSV, TEMPERATURE_CSV
+from warehouse_fdw import attach_staging, load_warehouse_fdw
+
 load_dotenv()
 
 DB_HOST = os.getenv("DB_HOST", "localhost")
@@ -12,6 +17,8 @@ DB_USER = os.getenv("DB_USER", "postgres")
 DB_PASS = os.getenv("DB_PASS", "your_password")
 DB_STAGING = os.getenv("DB_STAGING", "staging_db")
 DB_WAREHOUSE = os.getenv("DB_WAREHOUSE", "data_warehouse")
+# "python" moves rows through this script; "fdw" keeps the staging -> warehouse load server-side
+DW_LOAD_MODE = os.getenv("DW_LOAD_MODE", "python")
 
 conn_stg = psycopg2.connect(
     host=DB_HOST,
@@ -36,87 +43,75 @@ print("Staging tables truncated")
 
 print("Extracting data from sources")
 
+# One keep-alive session shared by every API call in this run
+session = make_session()
+# On-disk cache shared with ETL_notify.py: unchanged datasets cost a 304 (or nothing within the TTL)
+cache = ResponseCache()
+
 # Load temperature CSV
 
 api_url = "https://cckpapi.worldbank.org/api/v1/cru-x0.5_timeseries_tas_timeseries_annual_1901-2024_mean_historical_cru_ts4.09_mean/PHL?_format=json"
 print(f"Fetching Temperature Timeseries from World Bank API...")
 
-response = requests.get(api_url)
-
-if response.status_code != 200:
-    print(f"Request failed with status {response.status_code}")
-            
-temperature_data = response.json()
+try:
+    temperature_data = get_json(session, api_url, cache=cache)
+except (requests.RequestException, ValueError) as e:
+    print(f"Request failed: {e}")
+    temperature_data = {}
 temperature_data = temperature_data.get("data", {}).get("PHL", {})
 
 print(f"Finished fetching Temperature Timeseries Data...")
 
+csv_sources = [POWER_CSV]
+
 if not temperature_data:
-        print("No temperature records found for PHL.")
+    print("No temperature records found for PHL. Falling back to observed_timeseries_clean.csv")
+    csv_sources.append(TEMPERATURE_CSV)
 else:
-    for year_month, value in temperature_data.items():
-        # Extract just the year (e.g., from "1901-07" → 1901)
-        year = int(year_month.split("-")[0])
-
-        cur_stg.execute("""
-            INSERT INTO stg_temperature (year, avg_mean_temp_deg_c)
-            VALUES (%s, %s);
-        """, (year, value))
-
-# Load power CSV
-with open('power_generation_clean.csv', 'r') as f:
-    reader = csv.reader(f)
-    next(reader)
-    for row in reader:
-        cur_stg.copy_expert("""
-        COPY stg_power (year, biomass, coal, geothermal, hydro, natural_gas, oil_based, solar, wind, grand_total)
-        FROM STDIN WITH CSV;
-        """, f)
+    # Extract just the year (e.g., from "1901-07" → 1901); one COPY for the whole series
+    loaded = copy_rows(
+        cur_stg, "stg_temperature", ("year", "avg_mean_temp_deg_c"),
+        ((int(year_month.split("-")[0]), value) for year_month, value in temperature_data.items())
+    )
+    print(f"Staged {loaded} temperature records")
+
+# Load CSV sources (validated, one COPY per file, files in parallel)
+def connect_staging():
+    return psycopg2.connect(host=DB_HOST, database=DB_STAGING, user=DB_USER, password=DB_PASS)
+
+for path, loaded in load_csv_sources(csv_sources, connect_staging).items():
+    print(f"Staged {loaded} rows from {path}")
 
 # Fetch World Bank API → staging
 indicators = [
     'EG.ELC.COAL.ZS',  'EG.ELC.HYRO.ZS',  'EG.ELC.NGAS.ZS',
     'EG.ELC.NUCL.ZS', 'EG.ELC.PETR.ZS', 'EG.ELC.RNEW.ZS'
 ]
-worldbank_data = {}
-for indicator in indicators:
-    page = 1
-    all_records = []
-    while True:
-        api_url = f"https://api.worldbank.org/v2/country/all/indicator/{indicator}?format=json&per_page=1000&page={page}"
-        print(f"Fetching {indicator} page {page}...")
-        response = requests.get(api_url)
-        if response.status_code != 200:
-            print(f"Request failed with status {response.status_code}")
-            break
-        data_json = response.json()
-        if not data_json or len(data_json) < 2 or not data_json[1]: break
-        all_records.extend(data_json[1])
-        if page >= data_json[0].get('pages', 1): break
-        page += 1
-    worldbank_data[indicator] = all_records
-    print(f"Finished fetching {indicator}: {len(all_records)} records")
+# All indicator pages are fetched concurrently (page 1 first to learn the page counts)
+worldbank_data = fetch_indicators(indicators, per_page=1000, session=session, cache=cache)
+print(f"HTTP cache: {cache.stats()}")
 
 # Insert World Bank data into staging
-for indicator, records in worldbank_data.items():
-    for r in records:
-        cur_stg.execute("""
-            INSERT INTO stg_world_energy (
-                country_name, country_code, indicator_name, indicator_code, data_year,
-                coal_value, hydro_value, natural_gas_value, nuclear_value, oil_value, renewable_value
+def world_energy_rows():
+    # Each indicator fills its own value column (indicators are listed in column order)
+    for indicator, records in worldbank_data.items():
+        slot = indicators.index(indicator)
+        for r in records:
+            values = [None] * len(indicators)
+            values[slot] = r['value']
+            yield (
+                r['country']['value'], r['country']['id'],
+                r['indicator']['value'], r['indicator']['id'],
+                int(r['date']), *values
             )
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s);
-        """, (
-            r['country']['value'], r['country']['id'],
-            r['indicator']['value'], r['indicator']['id'],
-            int(r['date']),
-            r['value'] if indicator=='EG.ELC.COAL.ZS' else None,
-            r['value'] if indicator=='EG.ELC.HYRO.ZS' else None,
-            r['value'] if indicator=='EG.ELC.NGAS.ZS' else None,
-            r['value'] if indicator=='EG.ELC.NUCL.ZS' else None,
-            r['value'] if indicator=='EG.ELC.PETR.ZS' else None,
-            r['value'] if indicator=='EG.ELC.RNEW.ZS' else None
-        ))
+
+loaded = copy_rows(
+    cur_stg, "stg_world_energy",
+    ("country_name", "country_code", "indicator_name", "indicator_code", "data_year",
+     "coal_value", "hydro_value", "natural_gas_value", "nuclear_value", "oil_value", "renewable_value"),
+    world_energy_rows()
+)
+print(f"Staged {loaded} World Bank records")
 print("Extraction complete")
 
 
@@ -152,106 +147,108 @@ print("Transformation complete")
 
 print("Loading data into data warehouse")
 
-# --- DIMENSIONS ---
-cur_stg.execute("SELECT DISTINCT year FROM stg_power")
-years_power = cur_stg.fetchall()
-cur_stg.execute("SELECT DISTINCT data_year FROM stg_world_energy")
-years_wb = cur_stg.fetchall()
-cur_stg.execute("SELECT DISTINCT year FROM stg_temperature")
-years_temp = cur_stg.fetchall()
-all_years = sorted(set([y[0] for y in years_power + years_wb + years_temp]))
-cur_dw.executemany("INSERT INTO dim_date (year) VALUES (%s) ON CONFLICT (year) DO NOTHING;", [(y,) for y in all_years])
-
-cur_stg.execute("SELECT DISTINCT country_code, country_name FROM stg_world_energy")
-countries = cur_stg.fetchall()
-cur_dw.executemany("INSERT INTO dim_geo (country_code, country_name) VALUES (%s, %s) ON CONFLICT (country_code) DO UPDATE SET country_name = EXCLUDED.country_name;", countries)
-cur_dw.execute("INSERT INTO dim_geo (country_code, country_name) VALUES (%s, %s) ON CONFLICT (country_code) DO NOTHING;", ("PH", "Philippines"))
-
-# --- FACT TABLES ---
-def to_pg(value):
-    return value if value is not None else None
-
-cur_stg.execute("SELECT year, avg_mean_temp_deg_c FROM stg_temperature")
-weather_rows = []
-for year, temp in cur_stg.fetchall():
-    cur_dw.execute("SELECT date_key FROM dim_date WHERE year=%s", (year,))
-    date_key = cur_dw.fetchone()[0]
-    weather_rows.append((date_key, temp))
-cur_dw.executemany("INSERT INTO fact_weather (date_key, avg_mean_temp_deg_c) VALUES (%s, %s) ON CONFLICT (date_key) DO UPDATE SET avg_mean_temp_deg_c = EXCLUDED.avg_mean_temp_deg_c;", weather_rows)
-
-# --- fact_energy from stg_power (PH only) ---
-cur_stg.execute("SELECT * FROM stg_power")
-cur_dw.execute("SELECT geo_key FROM dim_geo WHERE country_code='PH'")
-geo_key = cur_dw.fetchone()[0]
-power_rows = []
-for row in cur_stg.fetchall():
-    year, biomass, coal, geothermal, hydro, ngas, oil, solar, wind, total = row
-    cur_dw.execute("SELECT date_key FROM dim_date WHERE year=%s", (year,))
-    date_key = cur_dw.fetchone()[0]
-    power_rows.append((
-        date_key, geo_key, to_pg(biomass), to_pg(coal), to_pg(geothermal),
-        to_pg(hydro), to_pg(ngas), to_pg(oil), to_pg(solar), to_pg(wind), to_pg(total)
-    ))
-    
-cur_dw.executemany(
-    """
-    INSERT INTO fact_energy (
-        date_key, geo_key, biomass_gwh, coal_gwh, geothermal_gwh, hydro_gwh,
-        natural_gas_gwh, oil_gwh, solar_gwh, wind_gwh, grand_total_gwh
+if DW_LOAD_MODE == "fdw":
+    # Server-side: staging is read through postgres_fdw and loaded with INSERT ... SELECT
+    attach_staging(cur_dw, DB_STAGING, DB_USER, DB_PASS)
+    load_warehouse_fdw(cur_dw)
+else:
+    # --- DIMENSIONS ---
+    cur_stg.execute("SELECT DISTINCT year FROM stg_power")
+    years_power = cur_stg.fetchall()
+    cur_stg.execute("SELECT DISTINCT data_year FROM stg_world_energy")
+    years_wb = cur_stg.fetchall()
+    cur_stg.execute("SELECT DISTINCT year FROM stg_temperature")
+    years_temp = cur_stg.fetchall()
+    all_years = sorted(set([y[0] for y in years_power + years_wb + years_temp]))
+
+    # Surrogate keys are resolved from these caches by every fact load below
+    date_keys = KeyResolver(cur_dw, "dim_date", "year", "date_key")
+    date_keys.ensure(all_years)
+
+    cur_stg.execute("SELECT DISTINCT country_code, country_name FROM stg_world_energy")
+    countries = cur_stg.fetchall()
+    geo_keys = KeyResolver(cur_dw, "dim_geo", "country_code", "geo_key", attributes=("country_name",))
+    if "PH" not in geo_keys.keys and "PH" not in {c[0] for c in countries}:
+        countries.append(("PH", "Philippines"))
+    geo_keys.ensure(countries)
+
+    # --- FACT TABLES ---
+    def to_pg(value):
+        return value if value is not None else None
+
+    cur_stg.execute("SELECT year, avg_mean_temp_deg_c FROM stg_temperature")
+    weather_rows = []
+    for year, temp in cur_stg.fetchall():
+        weather_rows.append((date_keys.get(year), temp))
+    cur_dw.executemany("INSERT INTO fact_weather (date_key, avg_mean_temp_deg_c) VALUES (%s, %s) ON CONFLICT (date_key) DO UPDATE SET avg_mean_temp_deg_c = EXCLUDED.avg_mean_temp_deg_c;", weather_rows)
+
+    # --- fact_energy from stg_power (PH only) ---
+    cur_stg.execute("""
+        SELECT year, biomass, coal, geothermal, hydro, natural_gas, oil_based, solar, wind, grand_total
+        FROM stg_power ORDER BY id
+    """)
+    geo_key = geo_keys.get("PH")
+    power_rows = []
+    for row in cur_stg.fetchall():
+        year, biomass, coal, geothermal, hydro, ngas, oil, solar, wind, total = row
+        date_key = date_keys.get(year)
+        power_rows.append((
+            date_key, geo_key, to_pg(biomass), to_pg(coal), to_pg(geothermal),
+            to_pg(hydro), to_pg(ngas), to_pg(oil), to_pg(solar), to_pg(wind), to_pg(total)
+        ))
+
+    cur_dw.executemany(
+        """
+        INSERT INTO fact_energy (
+            date_key, geo_key, biomass_gwh, coal_gwh, geothermal_gwh, hydro_gwh,
+            natural_gas_gwh, oil_gwh, solar_gwh, wind_gwh, grand_total_gwh
+        )
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+        ON CONFLICT (date_key, geo_key) DO UPDATE
+        SET biomass_gwh = EXCLUDED.biomass_gwh,
+            coal_gwh = EXCLUDED.coal_gwh,
+            geothermal_gwh = EXCLUDED.geothermal_gwh,
+            hydro_gwh = EXCLUDED.hydro_gwh,
+            natural_gas_gwh = EXCLUDED.natural_gas_gwh,
+            oil_gwh = EXCLUDED.oil_gwh,
+            solar_gwh = EXCLUDED.solar_gwh,
+            wind_gwh = EXCLUDED.wind_gwh,
+            grand_total_gwh = EXCLUDED.grand_total_gwh;
+        """,
+        power_rows
     )
-    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-    ON CONFLICT (date_key, geo_key) DO UPDATE
-    SET biomass_gwh = EXCLUDED.biomass_gwh,
-        coal_gwh = EXCLUDED.coal_gwh,
-        geothermal_gwh = EXCLUDED.geothermal_gwh,
-        hydro_gwh = EXCLUDED.hydro_gwh,
-        natural_gas_gwh = EXCLUDED.natural_gas_gwh,
-        oil_gwh = EXCLUDED.oil_gwh,
-        solar_gwh = EXCLUDED.solar_gwh,
-        wind_gwh = EXCLUDED.wind_gwh,
-        grand_total_gwh = EXCLUDED.grand_total_gwh;
-    """,
-    power_rows
-)
 
-# --- fact_energy from tr_world_energy (World Bank) ---
-cur_stg.execute("SELECT * FROM tr_world_energy")
-
-# Fetch all years and keys once
-cur_dw.execute("SELECT year, date_key FROM dim_date;")
-date_map = dict(cur_dw.fetchall())
-
-# Fetch all country codes and keys once
-cur_dw.execute("SELECT country_code, geo_key FROM dim_geo;")
-geo_map = dict(cur_dw.fetchall())
-
-rows = cur_stg.fetchall()
-output_rows = []
-for row in rows:
-    country_code, country_name, data_year, coal, hydro, ngas, nuclear, oil, renewable = row
-    date_key = date_map.get(data_year)
-    geo_key = geo_map.get(country_code)
-    output_rows.append((
-        date_key, geo_key, to_pg(coal), to_pg(hydro), to_pg(ngas),
-        to_pg(oil), to_pg(nuclear), to_pg(renewable)
-    ))
-    
-cur_dw.executemany(
-    """
-    INSERT INTO fact_energy (
-        date_key, geo_key, coal_pct, hydro_pct, natural_gas_pct, oil_pct, nuclear_pct, renewable_pct
+    # --- fact_energy from tr_world_energy (World Bank) ---
+    cur_stg.execute("SELECT * FROM tr_world_energy")
+
+    rows = cur_stg.fetchall()
+    output_rows = []
+    for row in rows:
+        country_code, country_name, data_year, coal, hydro, ngas, nuclear, oil, renewable = row
+        date_key = date_keys.get(data_year)
+        geo_key = geo_keys.get(country_code)
+        output_rows.append((
+            date_key, geo_key, to_pg(coal), to_pg(hydro), to_pg(ngas),
+            to_pg(oil), to_pg(nuclear), to_pg(renewable)
+        ))
+
+    cur_dw.executemany(
+        """
+        INSERT INTO fact_energy (
+            date_key, geo_key, coal_pct, hydro_pct, natural_gas_pct, oil_pct, nuclear_pct, renewable_pct
+        )
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+        ON CONFLICT (date_key, geo_key) DO UPDATE
+        SET coal_pct = EXCLUDED.coal_pct,
+            hydro_pct = EXCLUDED.hydro_pct,
+            natural_gas_pct = EXCLUDED.natural_gas_pct,
+            oil_pct = EXCLUDED.oil_pct,
+            nuclear_pct = EXCLUDED.nuclear_pct,
+            renewable_pct = EXCLUDED.renewable_pct;
+        """,
+        output_rows
     )
-    VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-    ON CONFLICT (date_key, geo_key) DO UPDATE
-    SET coal_pct = EXCLUDED.coal_pct,
-        hydro_pct = EXCLUDED.hydro_pct,
-        natural_gas_pct = EXCLUDED.natural_gas_pct,
-        oil_pct = EXCLUDED.oil_pct,
-        nuclear_pct = EXCLUDED.nuclear_pct,
-        renewable_pct = EXCLUDED.renewable_pct;
-    """,
-    output_rows
-)
+    print(f"Key resolver stats: {date_keys.stats()}; {geo_keys.stats()}")
 print("Data loading complete")
 
 # --- REFRESH MATERIALIZED VIEW (Optimization) ---
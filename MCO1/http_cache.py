@@ -0,0 +1,161 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from urllib.parse import urlencode
+
+# Shared by ETL_optimized.py and ETL_notify.py so a dataset is downloaded once per run
+HTTP_CACHE_DIR = os.getenv("HTTP_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".http_cache"))
+# Within the TTL a cached response is served without touching the network;
+# after it, the entry is revalidated with If-None-Match / If-Modified-Since.
+HTTP_CACHE_TTL = int(os.getenv("HTTP_CACHE_TTL", str(6 * 3600)))
+# Entries not used for this long are evicted
+HTTP_CACHE_MAX_AGE = int(os.getenv("HTTP_CACHE_MAX_AGE", str(30 * 24 * 3600)))
+HTTP_CACHE_MAX_BYTES = int(os.getenv("HTTP_CACHE_MAX_BYTES", str(200 * 1024 * 1024)))
+# Stores keep a running size; the directory is only rescanned when that passes
+# max_bytes, or this often to apply max_age
+HTTP_CACHE_SWEEP_SECS = int(os.getenv("HTTP_CACHE_SWEEP_SECS", "3600"))
+
+class CacheEntry:
+    def __init__(self, path, meta):
+        self.path = path
+        self.meta = meta
+
+    def is_fresh(self, ttl):
+        return time.time() - self.meta["stored_at"] < ttl
+
+    def json(self):
+        with open(self.path, "rb") as f:
+            return json.loads(f.read())
+
+class ResponseCache:
+    """On-disk HTTP response cache keyed by URL (+ query params)."""
+
+    def __init__(self, directory=HTTP_CACHE_DIR, ttl=HTTP_CACHE_TTL, max_age=HTTP_CACHE_MAX_AGE,
+                 max_bytes=HTTP_CACHE_MAX_BYTES, sweep_secs=HTTP_CACHE_SWEEP_SECS):
+        self.directory = directory
+        self.ttl = ttl
+        self.max_age = max_age
+        self.max_bytes = max_bytes
+        self.sweep_secs = sweep_secs
+        self.lock = threading.Lock()  # counters, size_bytes and eviction
+        self.size_bytes = None  # body bytes on disk; None until the first sweep
+        self.last_sweep = 0.0
+        self.hits = 0
+        self.revalidated = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def cache_key(url, params=None):
+        full_url = f"{url}?{urlencode(sorted(params.items()))}" if params else url
+        return hashlib.sha256(full_url.encode("utf-8")).hexdigest()
+
+    def _paths(self, key):
+        base = os.path.join(self.directory, key)
+        return base + ".body", base + ".meta.json"
+
+    def lookup(self, url, params=None):
+        body_path, meta_path = self._paths(self.cache_key(url, params))
+        try:
+            with open(meta_path, "r") as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if not os.path.exists(body_path):
+            return None
+        return CacheEntry(body_path, meta)
+
+    def conditional_headers(self, entry):
+        headers = {}
+        if entry.meta.get("etag"):
+            headers["If-None-Match"] = entry.meta["etag"]
+        if entry.meta.get("last_modified"):
+            headers["If-Modified-Since"] = entry.meta["last_modified"]
+        return headers
+
+    def touch(self, entry, revalidated=False):
+        """Marks an entry as used (and, after a 304, as freshly validated)."""
+        now = time.time()
+        entry.meta["accessed_at"] = now
+        if revalidated:
+            entry.meta["stored_at"] = now
+        with self.lock:
+            if revalidated:
+                self.revalidated += 1
+            else:
+                self.hits += 1
+        self._write(entry.path[:-len(".body")] + ".meta.json", json.dumps(entry.meta).encode("utf-8"))
+
+    def store(self, url, params, response):
+        body_path, meta_path = self._paths(self.cache_key(url, params))
+        try:
+            replaced = os.path.getsize(body_path)
+        except OSError:
+            replaced = 0
+        now = time.time()
+        meta = {
+            "url": response.url,
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+            "stored_at": now,
+            "accessed_at": now,
+            "size": len(response.content),
+        }
+        self._write(body_path, response.content)
+        self._write(meta_path, json.dumps(meta).encode("utf-8"))
+
+        with self.lock:
+            self.misses += 1
+            if self.size_bytes is not None:
+                self.size_bytes += meta["size"] - replaced
+            sweep = (self.size_bytes is None or self.size_bytes > self.max_bytes
+                     or now - self.last_sweep > self.sweep_secs)
+        if sweep:
+            self.evict()
+
+    def _write(self, path, data):
+        # Atomic replace so concurrent readers never see a half-written file
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+    def evict(self):
+        """Drops entries unused for max_age, then least-recently-used ones until under max_bytes; resyncs size_bytes."""
+        with self.lock:
+            entries = []
+            for name in os.listdir(self.directory):
+                if not name.endswith(".meta.json"):
+                    continue
+                meta_path = os.path.join(self.directory, name)
+                try:
+                    with open(meta_path, "r") as f:
+                        meta = json.load(f)
+                except (OSError, ValueError):
+                    continue
+                entries.append((meta.get("accessed_at", 0), meta.get("size", 0), meta_path))
+
+            now = time.time()
+            total = sum(size for _, size, _ in entries)
+            # Once over the cap, trim to 90% so the next stores do not each trigger a sweep
+            limit = self.max_bytes if total <= self.max_bytes else int(self.max_bytes * 0.9)
+            for accessed_at, size, meta_path in sorted(entries):
+                if now - accessed_at <= self.max_age and total <= limit:
+                    break
+                self._remove(meta_path)
+                total -= size
+            self.size_bytes = total
+            self.last_sweep = now
+
+    def _remove(self, meta_path):
+        for path in (meta_path, meta_path[:-len(".meta.json")] + ".body"):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def stats(self):
+        with self.lock:
+            return {"hits": self.hits, "revalidated": self.revalidated, "misses": self.misses}
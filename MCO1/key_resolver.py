@@ -0,0 +1,65 @@
+from psycopg2.extras import execute_values
+
+class KeyResolver:
+    """
+    Per-run cache of a dimension's natural key -> surrogate key.
+    The dimension is read once; keys that do not exist yet are created with
+    INSERT ... RETURNING so fact loads never query the dimension per row.
+    """
+
+    def __init__(self, cur, table, natural_key, surrogate_key, attributes=()):
+        self.cur = cur
+        self.table = table
+        self.natural_key = natural_key
+        self.surrogate_key = surrogate_key
+        self.attributes = tuple(attributes)  # extra columns refreshed on upsert
+        self.keys = {}
+        self.hits = 0
+        self.misses = 0
+        self.inserted = 0
+
+        cur.execute(f"SELECT {natural_key}, {surrogate_key} FROM {table}")
+        self.keys.update(cur.fetchall())
+
+    def _upsert(self, rows):
+        # ON CONFLICT DO UPDATE cannot touch the same key twice in one statement;
+        # the last row for a natural key wins, as with row-by-row upserts
+        rows = list({r[0]: r for r in rows}.values())
+        columns = (self.natural_key,) + self.attributes
+        # DO UPDATE (instead of DO NOTHING) so RETURNING also reports keys that already existed
+        updates = ", ".join(f"{col} = EXCLUDED.{col}" for col in columns[1:] or columns)
+        returned = execute_values(self.cur, f"""
+            INSERT INTO {self.table} ({", ".join(columns)}) VALUES %s
+            ON CONFLICT ({self.natural_key}) DO UPDATE SET {updates}
+            RETURNING {self.natural_key}, {self.surrogate_key}
+        """, rows, fetch=True)
+        self.keys.update(returned)
+
+    def ensure(self, rows):
+        """
+        Makes sure every row's natural key has a surrogate key, in one statement.
+        rows are (natural_key, *attributes). With attributes, every row is upserted
+        so their values are refreshed; otherwise only unknown keys are inserted.
+        """
+        rows = [r if isinstance(r, tuple) else (r,) for r in rows]
+        if not self.attributes:
+            rows = [r for r in rows if r[0] not in self.keys]
+        if rows:
+            before = len(self.keys)
+            self._upsert(rows)
+            self.inserted += len(self.keys) - before
+
+    def get(self, natural):
+        """Surrogate key for natural (created on the fly when the dimension has no attributes)."""
+        key = self.keys.get(natural)
+        if key is not None:
+            self.hits += 1
+            return key
+        self.misses += 1
+        if self.attributes:
+            return None
+        self.ensure([natural])
+        return self.keys.get(natural)
+
+    def stats(self):
+        return f"{self.table}: {len(self.keys)} keys, {self.hits} hits, {self.misses} misses, {self.inserted} inserted"
@@ -7,6 +7,7 @@ CREATE TABLE IF NOT EXISTS stg_temperature (
 );
 
 CREATE TABLE IF NOT EXISTS stg_power (
+    id SERIAL PRIMARY KEY,
     year INT NOT NULL,
     biomass NUMERIC,
     coal NUMERIC,
@@ -0,0 +1,115 @@
+import csv
+import io
+import os
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal, InvalidOperation
+
+# Rows per COPY statement; 0 sends each dataset as a single COPY
+COPY_CHUNK_ROWS = int(os.getenv("COPY_CHUNK_ROWS", "0"))
+CSV_LOAD_WORKERS = int(os.getenv("CSV_LOAD_WORKERS", "4"))
+
+# A CSV file to stage: one type per column (int or Decimal), header row required
+CsvSource = namedtuple("CsvSource", ["path", "table", "columns", "types"])
+
+class CsvValidationError(ValueError):
+    pass
+
+def _copy_buffer(cur, table, columns, buf):
+    buf.seek(0)
+    cur.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", buf)
+    return cur.rowcount
+
+def copy_rows(cur, table, columns, rows, chunk_rows=COPY_CHUNK_ROWS):
+    """
+    Serializes rows (any iterable of tuples) into an in-memory CSV buffer and
+    loads them with COPY ... FROM STDIN. None becomes NULL. With chunk_rows set,
+    the buffer is flushed every chunk_rows rows to bound memory.
+    Returns the number of rows the server reports as copied.
+    """
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    pending = 0
+    total = 0
+    for row in rows:
+        writer.writerow(row)
+        pending += 1
+        if chunk_rows and pending >= chunk_rows:
+            total += _copy_buffer(cur, table, columns, buf)
+            pending = 0
+            buf = io.StringIO()
+            writer = csv.writer(buf)
+    if pending:
+        total += _copy_buffer(cur, table, columns, buf)
+    return total
+
+def validate_csv(source, counter):
+    """
+    Streams the rows of a CSV source, checking the header width, the column count
+    and the type of every non-empty value. Empty values become NULL.
+    counter["rows"] is updated as rows pass validation.
+    """
+    with open(source.path, "r", newline="") as f:
+        reader = csv.reader(f)
+        header = next(reader, None)
+        if header is None:
+            raise CsvValidationError(f"{source.path}: file is empty")
+        if len(header) != len(source.columns):
+            raise CsvValidationError(
+                f"{source.path}: header has {len(header)} columns, expected {len(source.columns)} ({header})")
+
+        for line_no, row in enumerate(reader, start=2):
+            if not row:
+                continue
+            if len(row) != len(source.columns):
+                raise CsvValidationError(f"{source.path}:{line_no}: expected {len(source.columns)} columns, got {len(row)}")
+            values = []
+            for column, cast, raw in zip(source.columns, source.types, row):
+                raw = raw.strip()
+                if raw == "":
+                    values.append(None)
+                    continue
+                try:
+                    cast(raw)
+                except (ValueError, InvalidOperation):
+                    raise CsvValidationError(f"{source.path}:{line_no}: {column}={raw!r} is not {cast.__name__}")
+                values.append(raw)
+            counter["rows"] += 1
+            yield values
+
+def load_csv(cur, source):
+    """Validates and stages one CSV file with a single COPY, then checks the row count."""
+    counter = {"rows": 0}
+    # Nothing is sent until the whole file validated (single buffer, single COPY)
+    loaded = copy_rows(cur, source.table, source.columns, validate_csv(source, counter), chunk_rows=0)
+    if loaded != counter["rows"]:
+        raise CsvValidationError(f"{source.path}: validated {counter['rows']} rows but COPY loaded {loaded}")
+    return loaded
+
+def load_csv_sources(sources, connect, max_workers=CSV_LOAD_WORKERS):
+    """
+    Loads many CSV sources in parallel, each on its own connection from connect().
+    Each file commits independently. Returns {path: rows loaded}.
+    """
+    def load(source):
+        conn = connect()
+        try:
+            with conn, conn.cursor() as cur:
+                return source.path, load_csv(cur, source)
+        finally:
+            conn.close()
+
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(sources)))) as pool:
+        return dict(pool.map(load, sources))
+
+POWER_CSV = CsvSource(
+    "power_generation_clean.csv", "stg_power",
+    ("year", "biomass", "coal", "geothermal", "hydro", "natural_gas", "oil_based", "solar", "wind", "grand_total"),
+    (int,) + (Decimal,) * 9,
+)
+
+TEMPERATURE_CSV = CsvSource(
+    "observed_timeseries_clean.csv", "stg_temperature",
+    ("year", "avg_mean_temp_deg_c"),
+    (int, Decimal),
+)
@@ -0,0 +1,72 @@
+import os
+import sys
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import key_resolver
+from key_resolver import KeyResolver
+
+class FakeDimension:
+    """
+    Cursor over one in-memory dimension table. upsert() stands in for
+    execute_values(..., fetch=True) and, like PostgreSQL, rejects a statement
+    that would update the same natural key twice.
+    """
+
+    def __init__(self, rows=()):
+        self.rows = {natural: [key] + list(attrs) for key, (natural, *attrs) in enumerate(rows, 1)}
+        self.next_key = len(self.rows) + 1
+        self.statements = 0
+
+    def execute(self, sql, params=None):
+        self.result = [(natural, row[0]) for natural, row in self.rows.items()]
+
+    def fetchall(self):
+        return self.result
+
+    def upsert(self, cur, sql, rows, fetch=False):
+        self.statements += 1
+        naturals = [r[0] for r in rows]
+        if len(naturals) != len(set(naturals)):
+            raise ValueError("ON CONFLICT DO UPDATE command cannot affect row a second time")
+        returned = []
+        for natural, *attrs in rows:
+            if natural not in self.rows:
+                self.rows[natural] = [self.next_key]
+                self.next_key += 1
+            self.rows[natural][1:] = attrs
+            returned.append((natural, self.rows[natural][0]))
+        return returned
+
+class KeyResolverTest(unittest.TestCase):
+    def resolver(self, dim, attributes=()):
+        patcher = mock.patch.object(key_resolver, "execute_values", dim.upsert)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        return KeyResolver(dim, "dim_geo", "country_code", "geo_key", attributes)
+
+    def test_duplicate_natural_keys_are_upserted_once(self):
+        # tr_world_energy: one row per country and year
+        dim = FakeDimension([("PH", "Philippines")])
+        resolver = self.resolver(dim, attributes=("country_name",))
+        resolver.ensure([("PH", "Philippines"), ("JP", "Japan"), ("PH", "Republic of the Philippines"), ("JP", "Japan")])
+
+        self.assertEqual(dim.statements, 1)
+        self.assertEqual(resolver.inserted, 1)
+        self.assertEqual(resolver.get("PH"), 1)
+        self.assertEqual(resolver.get("JP"), 2)
+        self.assertEqual(dim.rows["PH"], [1, "Republic of the Philippines"])
+
+    def test_duplicate_unknown_keys_without_attributes(self):
+        dim = FakeDimension()
+        resolver = self.resolver(dim)
+        resolver.ensure([2001, 2002, 2001])
+
+        self.assertEqual(resolver.inserted, 2)
+        self.assertEqual(resolver.get(2001), 1)
+        self.assertEqual(resolver.get(2002), 2)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,109 @@
+import importlib
+import json
+import os
+import sys
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+class StubWorldBank(BaseHTTPRequestHandler):
+    """
+    Serves /v2/country/all/indicator/<code>?page=N from the class-level `pages`
+    ({code: [records per page]}). `failures` maps (code, page) to a list of
+    statuses returned (one per request) before the page is served.
+    """
+    pages = {}
+    failures = {}
+    requests = []
+    lock = threading.Lock()
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        code = url.path.rsplit("/", 1)[-1]
+        page = int(parse_qs(url.query)["page"][0])
+        with self.lock:
+            self.requests.append((code, page))
+            statuses = self.failures.get((code, page))
+            status = statuses.pop(0) if statuses else 200
+        if code not in self.pages:
+            status = 404
+        if status != 200:
+            self.send_response(status)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        body = json.dumps([{"page": page, "pages": len(self.pages[code])}, self.pages[code][page - 1]]).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+def record(code, year):
+    return {"indicator": {"id": code}, "date": str(year), "value": year % 7}
+
+class FetchIndicatorsTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), StubWorldBank)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        os.environ["WORLDBANK_API_URL"] = f"http://127.0.0.1:{cls.server.server_port}/v2"
+        os.environ["FETCH_BACKOFF"] = "0"
+        os.environ["FETCH_MAX_RETRIES"] = "2"
+        import worldbank_fetcher
+        cls.fetcher = importlib.reload(worldbank_fetcher)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        for name in ("WORLDBANK_API_URL", "FETCH_BACKOFF", "FETCH_MAX_RETRIES"):
+            os.environ.pop(name, None)
+
+    def setUp(self):
+        StubWorldBank.pages = {
+            "EG.A": [[record("EG.A", y) for y in range(p * 3, p * 3 + 3)] for p in range(3)],
+            "EG.B": [[record("EG.B", 2000)]],
+        }
+        StubWorldBank.failures = {}
+        StubWorldBank.requests = []
+
+    def test_reads_every_page_in_order(self):
+        results = self.fetcher.fetch_indicators(["EG.A", "EG.B"], per_page=3, max_workers=4)
+
+        self.assertEqual([int(r["date"]) for r in results["EG.A"]], list(range(9)))
+        self.assertEqual(len(results["EG.B"]), 1)
+        self.assertEqual(sorted(StubWorldBank.requests), [("EG.A", 1), ("EG.A", 2), ("EG.A", 3), ("EG.B", 1)])
+
+    def test_retries_transient_errors(self):
+        StubWorldBank.failures = {("EG.A", 2): [503, 500]}
+
+        results = self.fetcher.fetch_indicators(["EG.A"], per_page=3, max_workers=2)
+
+        self.assertEqual(len(results["EG.A"]), 9)
+        self.assertEqual(StubWorldBank.requests.count(("EG.A", 2)), 3)
+
+    def test_raises_when_retries_are_exhausted(self):
+        StubWorldBank.failures = {("EG.A", 3): [503, 503, 503]}
+
+        with self.assertRaises(self.fetcher.FetchError) as ctx:
+            self.fetcher.fetch_indicators(["EG.A", "EG.B"], per_page=3, max_workers=2)
+
+        self.assertEqual([(ind, page) for ind, page, _ in ctx.exception.failures], [("EG.A", 3)])
+        self.assertEqual(StubWorldBank.requests.count(("EG.A", 3)), 3)
+
+    def test_raises_on_client_errors_without_retrying(self):
+        with self.assertRaises(self.fetcher.FetchError) as ctx:
+            self.fetcher.fetch_indicators(["EG.A", "EG.MISSING"], per_page=3, max_workers=2)
+
+        self.assertEqual([(ind, page) for ind, page, _ in ctx.exception.failures], [("EG.MISSING", 1)])
+        self.assertEqual(StubWorldBank.requests.count(("EG.MISSING", 1)), 1)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,125 @@
+import os
+
+# Staging as seen from the warehouse server (usually the same Postgres instance)
+FDW_HOST = os.getenv("DW_FDW_HOST", os.getenv("DB_HOST", "localhost"))
+FDW_PORT = os.getenv("DW_FDW_PORT", "5432")
+FDW_SERVER = "staging_srv"
+# Owned by this module: only the foreign tables below are ever dropped from it
+FDW_SCHEMA = "staging_fdw"
+
+STAGING_TABLES = ("stg_temperature", "stg_power", "tr_world_energy")
+
+def attach_staging(cur_dw, staging_db, user, password):
+    """Exposes the staging tables inside the warehouse as foreign tables in schema staging_fdw."""
+    cur_dw.execute("CREATE EXTENSION IF NOT EXISTS postgres_fdw;")
+    cur_dw.execute("SELECT 1 FROM pg_foreign_server WHERE srvname = %s;", (FDW_SERVER,))
+    if cur_dw.fetchone():
+        # Apply changed DW_FDW_HOST / DW_FDW_PORT / database on existing installs
+        cur_dw.execute(f"""
+            ALTER SERVER {FDW_SERVER} OPTIONS (SET host %s, SET port %s, SET dbname %s);
+        """, (FDW_HOST, FDW_PORT, staging_db))
+    else:
+        cur_dw.execute(f"""
+            CREATE SERVER {FDW_SERVER} FOREIGN DATA WRAPPER postgres_fdw
+            OPTIONS (host %s, port %s, dbname %s);
+        """, (FDW_HOST, FDW_PORT, staging_db))
+
+    cur_dw.execute("""
+        SELECT 1 FROM pg_user_mappings WHERE srvname = %s AND usename = CURRENT_USER;
+    """, (FDW_SERVER,))
+    if cur_dw.fetchone():
+        cur_dw.execute(f"""
+            ALTER USER MAPPING FOR CURRENT_USER SERVER {FDW_SERVER}
+            OPTIONS (SET user %s, SET password %s);
+        """, (user, password))
+    else:
+        cur_dw.execute(f"""
+            CREATE USER MAPPING FOR CURRENT_USER SERVER {FDW_SERVER}
+            OPTIONS (user %s, password %s);
+        """, (user, password))
+
+    # Re-import every run: tr_world_energy is rebuilt by the transform step
+    cur_dw.execute(f"CREATE SCHEMA IF NOT EXISTS {FDW_SCHEMA};")
+    cur_dw.execute(f"""
+        DROP FOREIGN TABLE IF EXISTS {", ".join(f"{FDW_SCHEMA}.{t}" for t in STAGING_TABLES)};
+    """)
+    cur_dw.execute(f"""
+        IMPORT FOREIGN SCHEMA public LIMIT TO ({", ".join(STAGING_TABLES)})
+        FROM SERVER {FDW_SERVER} INTO {FDW_SCHEMA};
+    """)
+
+def load_warehouse_fdw(cur_dw):
+    """
+    Loads dimensions and facts with INSERT ... SELECT statements over the foreign
+    staging tables, so no rows pass through Python. DISTINCT ON keeps one source
+    row per target key (the last staged one, like the row-by-row upserts did).
+    """
+    cur_dw.execute(f"""
+        INSERT INTO dim_date (year)
+        SELECT year FROM {FDW_SCHEMA}.stg_power
+        UNION SELECT data_year FROM {FDW_SCHEMA}.tr_world_energy
+        UNION SELECT year FROM {FDW_SCHEMA}.stg_temperature
+        ON CONFLICT (year) DO NOTHING;
+    """)
+
+    cur_dw.execute(f"""
+        INSERT INTO dim_geo (country_code, country_name)
+        SELECT DISTINCT ON (country_code) country_code, country_name
+        FROM {FDW_SCHEMA}.tr_world_energy
+        ORDER BY country_code
+        ON CONFLICT (country_code) DO UPDATE SET country_name = EXCLUDED.country_name;
+    """)
+    cur_dw.execute("INSERT INTO dim_geo (country_code, country_name) VALUES ('PH', 'Philippines') ON CONFLICT (country_code) DO NOTHING;")
+
+    cur_dw.execute(f"""
+        INSERT INTO fact_weather (date_key, avg_mean_temp_deg_c)
+        SELECT DISTINCT ON (d.date_key) d.date_key, t.avg_mean_temp_deg_c
+        FROM {FDW_SCHEMA}.stg_temperature t
+        JOIN dim_date d ON d.year = t.year
+        ORDER BY d.date_key, t.id DESC
+        ON CONFLICT (date_key) DO UPDATE SET avg_mean_temp_deg_c = EXCLUDED.avg_mean_temp_deg_c;
+    """)
+
+    cur_dw.execute(f"""
+        INSERT INTO fact_energy (
+            date_key, geo_key, biomass_gwh, coal_gwh, geothermal_gwh, hydro_gwh,
+            natural_gas_gwh, oil_gwh, solar_gwh, wind_gwh, grand_total_gwh
+        )
+        SELECT DISTINCT ON (d.date_key)
+            d.date_key, g.geo_key, p.biomass, p.coal, p.geothermal, p.hydro,
+            p.natural_gas, p.oil_based, p.solar, p.wind, p.grand_total
+        FROM {FDW_SCHEMA}.stg_power p
+        JOIN dim_date d ON d.year = p.year
+        JOIN dim_geo g ON g.country_code = 'PH'
+        ORDER BY d.date_key, p.id DESC
+        ON CONFLICT (date_key, geo_key) DO UPDATE
+        SET biomass_gwh = EXCLUDED.biomass_gwh,
+            coal_gwh = EXCLUDED.coal_gwh,
+            geothermal_gwh = EXCLUDED.geothermal_gwh,
+            hydro_gwh = EXCLUDED.hydro_gwh,
+            natural_gas_gwh = EXCLUDED.natural_gas_gwh,
+            oil_gwh = EXCLUDED.oil_gwh,
+            solar_gwh = EXCLUDED.solar_gwh,
+            wind_gwh = EXCLUDED.wind_gwh,
+            grand_total_gwh = EXCLUDED.grand_total_gwh;
+    """)
+
+    cur_dw.execute(f"""
+        INSERT INTO fact_energy (
+            date_key, geo_key, coal_pct, hydro_pct, natural_gas_pct, oil_pct, nuclear_pct, renewable_pct
+        )
+        SELECT DISTINCT ON (d.date_key, g.geo_key)
+            d.date_key, g.geo_key, w.coal_value, w.hydro_value, w.natural_gas_value,
+            w.oil_value, w.nuclear_value, w.renewable_value
+        FROM {FDW_SCHEMA}.tr_world_energy w
+        JOIN dim_date d ON d.year = w.data_year
+        JOIN dim_geo g ON g.country_code = w.country_code
+        ORDER BY d.date_key, g.geo_key
+        ON CONFLICT (date_key, geo_key) DO UPDATE
+        SET coal_pct = EXCLUDED.coal_pct,
+            hydro_pct = EXCLUDED.hydro_pct,
+            natural_gas_pct = EXCLUDED.natural_gas_pct,
+            oil_pct = EXCLUDED.oil_pct,
+            nuclear_pct = EXCLUDED.nuclear_pct,
+            renewable_pct = EXCLUDED.renewable_pct;
+    """)
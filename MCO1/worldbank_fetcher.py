@@ -0,0 +1,118 @@
+import os
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from requests.adapters import HTTPAdapter
+
+# Override to point the fetcher at a local stub server when testing
+WORLDBANK_API_URL = os.getenv("WORLDBANK_API_URL", "https://api.worldbank.org/v2")
+
+MAX_WORKERS = int(os.getenv("FETCH_MAX_WORKERS", "8"))
+REQUEST_TIMEOUT = float(os.getenv("FETCH_TIMEOUT", "30"))
+MAX_RETRIES = int(os.getenv("FETCH_MAX_RETRIES", "4"))
+BACKOFF_SECONDS = float(os.getenv("FETCH_BACKOFF", "0.5"))
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+class FetchError(Exception):
+    """Raised by fetch_indicators when pages still failed after their retries."""
+
+    def __init__(self, failures):
+        self.failures = failures  # [(indicator, page, exception)]
+        detail = "; ".join(f"{ind} page {page}: {err}" for ind, page, err in failures)
+        super().__init__(f"{len(failures)} page(s) failed: {detail}")
+
+def make_session(pool_size=MAX_WORKERS):
+    """Keep-alive session whose connection pool matches the worker count."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+def get_json(session, url, params=None, timeout=REQUEST_TIMEOUT, retries=MAX_RETRIES, backoff=BACKOFF_SECONDS, cache=None):
+    """
+    GET with a per-request timeout and exponential backoff (with jitter) on transient failures.
+    With a ResponseCache, fresh entries skip the network and stale ones are revalidated
+    (a 304 reuses the cached body).
+    """
+    entry = cache.lookup(url, params) if cache else None
+    if entry and entry.is_fresh(cache.ttl):
+        cache.touch(entry)
+        return entry.json()
+    headers = cache.conditional_headers(entry) if entry else {}
+
+    for attempt in range(retries + 1):
+        try:
+            response = session.get(url, params=params, headers=headers, timeout=timeout)
+            if response.status_code == 304 and entry:
+                cache.touch(entry, revalidated=True)
+                return entry.json()
+            if response.status_code not in RETRY_STATUSES:
+                response.raise_for_status()
+                data = response.json()
+                if cache:
+                    cache.store(url, params, response)
+                return data
+            error = requests.HTTPError(f"{response.status_code} from {response.url}", response=response)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            error = e
+
+        if attempt == retries:
+            raise error
+        delay = backoff * (2 ** attempt) * (1 + random.random())
+        print(f"Retrying {url} in {delay:.1f}s ({error})")
+        time.sleep(delay)
+
+def fetch_indicator_page(session, indicator, page, per_page=1000, base_url=WORLDBANK_API_URL, cache=None):
+    """Returns (pages, records) for one page of an indicator across all countries."""
+    data = get_json(
+        session,
+        f"{base_url}/country/all/indicator/{indicator}",
+        params={"format": "json", "per_page": per_page, "page": page},
+        cache=cache,
+    )
+    if not data or len(data) < 2 or not data[1]:
+        return 0, []
+    return data[0].get("pages", 1), data[1]
+
+def fetch_indicators(indicators, per_page=1000, max_workers=MAX_WORKERS, base_url=WORLDBANK_API_URL, session=None, cache=None):
+    """
+    Fetches every page of every indicator concurrently.
+    Wave 1 requests page 1 of each indicator to learn its page count; wave 2 fans
+    out all remaining pages at once. Concurrency is bounded by max_workers.
+    Returns {indicator: [records in page order]}. Raises FetchError (after every
+    other page finished) if any page failed, so partial data is never returned.
+    """
+    session = session or make_session(max_workers)
+    pages_by_indicator = {ind: {} for ind in indicators}
+    failures = []
+
+    def fetch(job):
+        indicator, page = job
+        try:
+            return indicator, page, fetch_indicator_page(session, indicator, page, per_page, base_url, cache)
+        except (requests.RequestException, ValueError) as e:
+            print(f"Request failed for {indicator} page {page}: {e}")
+            failures.append((indicator, page, e))
+            return indicator, page, (0, [])
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        remaining = []
+        for indicator, page, (pages, records) in pool.map(fetch, [(ind, 1) for ind in indicators]):
+            pages_by_indicator[indicator][page] = records
+            remaining.extend((indicator, p) for p in range(2, pages + 1))
+            print(f"Fetched {indicator} page 1/{pages}")
+
+        for indicator, page, (_, records) in pool.map(fetch, remaining):
+            pages_by_indicator[indicator][page] = records
+
+    if failures:
+        raise FetchError(sorted(failures, key=lambda f: (f[0], f[1])))
+
+    results = {}
+    for indicator, pages in pages_by_indicator.items():
+        results[indicator] = [r for page in sorted(pages) for r in pages[page]]
+        print(f"Finished fetching {indicator}: {len(results[indicator])} records")
+    return results
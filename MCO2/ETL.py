@@ -1,19 +1,41 @@
 import psycopg2
 import os
+import argparse
 import time  # <--- NEW IMPORT
-from datetime import timedelta, date
+from collections import namedtuple
 from dotenv import load_dotenv
 
+from etl_loader import MergeTarget, LOAD_MODES, merge_rows
+from etl_pipeline import run_pipeline
+from key_map import SurrogateKeyMap
+from calendar_dim import ensure_calendar
+from fact_partitions import ensure_partitions
+from etl_scheduler import AdaptiveScheduler
+from etl_metrics import METRICS, start_metrics_server, log_event
+
 load_dotenv()
 
 # 1. CONFIGURATION
 SOURCE_CONFIG = {
     "host": os.getenv("DB_SOURCE_HOST", "localhost"),
+    "port": os.getenv("DB_SOURCE_PORT", "5432"),
     "database": os.getenv("DB_SOURCE_NAME", "pokemon_app_db"),
     "user": os.getenv("DB_SOURCE_USER", "postgres"),
     "password": os.getenv("DB_SOURCE_PASS", "password")
 }
 
+# Physical standby of the OLTP primary (db_hot). Same database and credentials.
+STANDBY_CONFIG = {
+    **SOURCE_CONFIG,
+    "host": os.getenv("DB_STANDBY_HOST", "localhost"),
+    "port": os.getenv("DB_STANDBY_PORT", "5434"),
+}
+
+# "standby": extract from db_hot while it is within ETL_STANDBY_MAX_LAG seconds
+# of the primary, otherwise fall back to the primary. "primary": never use it.
+SOURCE_MODE = os.getenv("ETL_SOURCE_MODE", "primary")
+STANDBY_MAX_LAG = float(os.getenv("ETL_STANDBY_MAX_LAG", "30"))
+
 TARGET_CONFIG = {
     "host": os.getenv("DB_TARGET_HOST", "localhost"),
     "database": os.getenv("DB_TARGET_NAME", "pokemon_olap_db"),
@@ -21,147 +43,480 @@ TARGET_CONFIG = {
     "password": os.getenv("DB_TARGET_PASS", "password")
 }
 
-def run_etl_bridge():
+# "copy" streams each batch through a temp staging table; "executemany" upserts row by row
+LOAD_MODE = os.getenv("ETL_LOAD_MODE", "copy")
+
+DIM_PRODUCT = MergeTarget(
+    "dim_product",
+    ("product_id_oltp", "card_name", "set_name", "series_name", "rarity", "condition", "current_price"),
+    ("product_id_oltp",),
+    ("current_price", "condition"),
+)
+DIM_CUSTOMER = MergeTarget(
+    "dim_customer",
+    ("customer_id_oltp", "user_name", "full_name"),
+    ("customer_id_oltp",),
+    ("user_name", "full_name"),
+)
+FACT_SALES = MergeTarget(
+    "fact_sales",
+    ("date_key", "product_key", "customer_key", "order_id", "quantity_sold", "unit_price", "total_revenue"),
+    ("order_id", "product_key", "date_key"),  # date_key: partition key of fact_sales
+    ("quantity_sold", "total_revenue", "unit_price"),
+)
+
+# Change detection for a dimension: md5 of the columns the merge maintains
+# (target.update_columns), computed with identical types on both databases so
+# unchanged rows hash the same. Only new or changed rows are shipped.
+#   source_columns: source expressions in target.columns order
+#   source_from:    FROM / JOIN clause shared by the digest and the row queries
+DimSource = namedtuple("DimSource", ["target", "source_columns", "source_from", "key_expr", "source_digest", "target_digest"])
+
+PRODUCT_SOURCE = DimSource(
+    DIM_PRODUCT,
+    "p.product_id, c.card_name, s.set_name, s.series, c.rarity, p.condition, p.price",
+    """
+        FROM Product p 
+        JOIN Card c ON p.card_id = c.card_id 
+        JOIN "Set" s ON c.set_id = s.set_id
+    """,
+    "p.product_id",
+    "md5(ROW(p.condition::text, p.price::numeric(10,2))::text)",
+    "md5(ROW(condition::text, current_price::numeric(10,2))::text)",
+)
+CUSTOMER_SOURCE = DimSource(
+    DIM_CUSTOMER,
+    "customer_id, user_name, first_name || ' ' || last_name",
+    "FROM Customer",
+    "customer_id",
+    "md5(ROW(user_name::text, (first_name || ' ' || last_name)::text)::text)",
+    "md5(ROW(user_name::text, full_name::text)::text)",
+)
+
+# Overlap extract / transform / load with bounded queues instead of running them in turn
+PIPELINE = os.getenv("ETL_PIPELINE", "0") == "1"
+PIPELINE_QUEUE_DEPTH = int(os.getenv("ETL_PIPELINE_QUEUE_DEPTH", "4"))
+PIPELINE_WORKERS = int(os.getenv("ETL_PIPELINE_WORKERS", "1"))
+
+BATCH_SIZE = 2000
+
+# Sales line extract shared by the incremental sync and the backfills
+SALES_SELECT = """
+    SELECT 
+        to_char(o.order_date, 'YYYYMMDD')::int, oi.product_id, o.customer_id, 
+        o.order_id, oi.quantity, oi.price_at_sale, (oi.quantity * oi.price_at_sale),
+        oi.order_item_id, o.order_date
+    FROM OrderItem oi 
+    JOIN "Order" o ON oi.order_id = o.order_id
+"""
+
+def standby_lag(conn):
+    """
+    Returns replay lag in seconds, or None if the server is not in recovery.
+    A standby that has replayed everything it received counts as 0, so an idle
+    primary does not make it look stale.
+    """
+    cur = conn.cursor()
+    cur.execute("""
+        SELECT pg_is_in_recovery(),
+               pg_last_wal_receive_lsn() IS NOT NULL
+                   AND pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn(),
+               EXTRACT(EPOCH FROM NOW() - pg_last_xact_replay_timestamp())
+    """)
+    in_recovery, caught_up, lag = cur.fetchone()
+    cur.close()
+    conn.commit()
+    if not in_recovery:
+        return None
+    if caught_up:
+        return 0.0
+    return float(lag) if lag is not None else float("inf")
+
+def connect_source(mode=SOURCE_MODE, max_lag=STANDBY_MAX_LAG):
+    """
+    Opens the extraction connection: the db_hot standby when mode is "standby"
+    and it is reachable, in recovery and within max_lag seconds; otherwise the
+    primary. Returns (connection, "standby" | "primary").
+    """
+    if mode == "standby":
+        conn = None
+        try:
+            conn = psycopg2.connect(connect_timeout=5, **STANDBY_CONFIG)
+            lag = standby_lag(conn)
+            if lag is not None and lag <= max_lag:
+                METRICS.set("source_standby", 1)
+                METRICS.set("source_standby_lag_seconds", round(lag, 1))
+                return conn, "standby"
+            reason = "not in recovery" if lag is None else f"{lag:.0f}s behind (max {max_lag:.0f}s)"
+            conn.close()
+        except psycopg2.Error as e:
+            if conn: conn.close()
+            reason = f"unreachable ({str(e).strip()})"
+        print(f"Standby {reason}; extracting from the primary.")
+        METRICS.inc("source_fallbacks_total")
+    METRICS.set("source_standby", 0)
+    return psycopg2.connect(**SOURCE_CONFIG), "primary"
+
+# 2. INCREMENTAL EXTRACTION (High-Water Mark)
+WATERMARK_NAME = "fact_sales"
+
+# Serial ids are handed out before commit, so a concurrent checkout can become
+# visible with an id just below the watermark. Re-reading a small window of ids
+# behind the watermark catches those rows; the fact upsert makes it harmless.
+WATERMARK_OVERLAP = int(os.getenv("ETL_WATERMARK_OVERLAP", "500"))
+
+def ensure_watermark_table(cur):
+    """Create the watermark control table on OLAP databases built before it existed."""
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS etl_watermark (
+            source_name VARCHAR(100) PRIMARY KEY,
+            last_order_item_id INT NOT NULL DEFAULT 0,
+            last_order_id INT,
+            last_order_date TIMESTAMPTZ,
+            updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+        );
+    """)
+
+def get_watermark(cur):
+    """Returns the last committed order_item_id (0 if nothing was synced yet)."""
+    cur.execute("SELECT last_order_item_id FROM etl_watermark WHERE source_name = %s", (WATERMARK_NAME,))
+    row = cur.fetchone()
+    return row[0] if row else 0
+
+def save_watermark(cur, order_item_id, order_id, order_date):
+    """
+    Advances the watermark (never moves it back; the order id / date always
+    describe the item it points at). Runs in the same transaction as the fact
+    rows it covers.
+    """
+    cur.execute("""
+        INSERT INTO etl_watermark (source_name, last_order_item_id, last_order_id, last_order_date, updated_at)
+        VALUES (%s, %s, %s, %s, NOW())
+        ON CONFLICT (source_name) DO UPDATE SET
+            last_order_item_id = EXCLUDED.last_order_item_id,
+            last_order_id = EXCLUDED.last_order_id,
+            last_order_date = EXCLUDED.last_order_date,
+            updated_at = NOW()
+        WHERE EXCLUDED.last_order_item_id > etl_watermark.last_order_item_id;
+    """, (WATERMARK_NAME, order_item_id, order_id, order_date))
+
+def sync_changed_rows(conn_source, cur_target, dim, load_mode=LOAD_MODE):
+    """
+    Compares per-row digests from the source and the warehouse and merges only
+    inserted or changed rows. Returns (rows merged, source rows).
+    """
+    target = dim.target
+    natural_key = target.conflict_columns[0]
+    cur_source = conn_source.cursor()
+
+    cur_source.execute(f"SELECT {dim.key_expr}, {dim.source_digest} {dim.source_from}")
+    cur_target.execute(f"SELECT {natural_key}, {dim.target_digest} FROM {target.table}")
+    warehouse = dict(cur_target.fetchall())
+    source = cur_source.fetchall()
+    changed = [row[0] for row in source if warehouse.get(row[0]) != row[1]]
+
+    merged = 0
+    if changed:
+        cur_source.execute(f"SELECT {dim.source_columns} {dim.source_from} WHERE {dim.key_expr} = ANY(%s)", (changed,))
+        merged = merge_rows(cur_target, target, cur_source.fetchall(), load_mode)
+    cur_source.close()
+    return merged, len(source)
+
+def bump_data_version(cur):
+    """Tells report caches that OLAP data changed (takes effect when the caller commits)."""
+    cur.execute("SELECT bump_olap_data_version()")
+    return cur.fetchone()[0]
+
+def sync_dimensions(conn_source, cur_target, load_mode=LOAD_MODE, after_order_item_id=0):
+    """
+    Merges changed dim_product / dim_customer rows and extends dim_date to cover
+    the orders behind OrderItem rows after after_order_item_id, then commits.
+    Returns the number of dimension rows added or changed.
+    """
+    changed = 0
+    with METRICS.timer("stage_seconds", stage="dimensions"):
+        for dim in (PRODUCT_SOURCE, CUSTOMER_SOURCE):
+            merged, total = sync_changed_rows(conn_source, cur_target, dim, load_mode)
+            METRICS.inc("dimension_rows_merged_total", merged, table=dim.target.table)
+            changed += merged
+            if merged:
+                print(f"   {dim.target.table}: {merged} of {total} rows new or changed")
+
+    # Date: only the orders about to be extracted (an OrderItem primary key range)
+    with METRICS.timer("stage_seconds", stage="dates"):
+        cur_date_source = conn_source.cursor()
+        cur_date_source.execute("""
+            SELECT MIN(o.order_date)::date, MAX(o.order_date)::date
+            FROM OrderItem oi
+            JOIN "Order" o ON oi.order_id = o.order_id
+            WHERE oi.order_item_id > %s
+        """, (after_order_item_id,))
+        first, last = cur_date_source.fetchone()
+        cur_date_source.close()
+
+        added = ensure_calendar(cur_target, first, last)
+        ensure_partitions(cur_target, first, last)
+    if added:
+        print(f"   dim_date: added {added} days")
+    cur_target.connection.commit()
+    return changed + added
+
+# Kept for the life of the process; each cycle only loads keys created since the last one
+PRODUCT_KEYS = SurrogateKeyMap("dim_product", "product_id_oltp", "product_key")
+CUSTOMER_KEYS = SurrogateKeyMap("dim_customer", "customer_id_oltp", "customer_key")
+
+def load_key_maps(cur_target):
+    """OLTP id -> surrogate key maps for the fact transform, refreshed incrementally."""
+    PRODUCT_KEYS.refresh(cur_target)
+    CUSTOMER_KEYS.refresh(cur_target)
+    return PRODUCT_KEYS, CUSTOMER_KEYS
+
+def format_key_map_stats(*maps):
+    parts = []
+    for m in maps:
+        st = m.stats()
+        parts.append(f"{m.table}: {st['keys']} keys ({st['mode']}, {st['memory_bytes'] / 1024:.0f} KiB), "
+                     f"hit rate {st['hit_rate']:.1%}")
+    return "; ".join(parts)
+
+def transform_sales(rows, p_map, c_map):
+    """
+    Maps OLTP ids to surrogate keys. Rows whose product/customer is not in the
+    dimensions yet are skipped. Returns (facts, last row the watermark may move
+    to, first skipped order_item_id): the watermark stops before the first
+    skipped row (None if that is the chunk's first row) so it is retried.
+    """
+    started = time.perf_counter()
+    facts = []
+    last = rows[-1]
+    first_skipped = None
+    for i, row in enumerate(rows):
+        d_key, pid, cid, oid, qty, price, total, _, _ = row
+        p_key = p_map.get(pid)
+        c_key = c_map.get(cid)
+        if p_key and c_key:
+            facts.append((d_key, p_key, c_key, oid, qty, price, total))
+        elif first_skipped is None:
+            first_skipped = row[7]
+            last = rows[i - 1] if i else None
+    METRICS.inc("facts_skipped_total", len(rows) - len(facts))
+    METRICS.observe("stage_seconds", time.perf_counter() - started, stage="transform")
+    return facts, last, first_skipped
+
+def load_sales_chunk(cur_target, mapped, load_mode, held):
+    """
+    Merges one chunk of facts and advances the watermark in the same transaction.
+    held is per batch: once a chunk skipped a row, later chunks still merge but
+    leave the watermark where it is. Returns fact rows inserted or changed.
+    """
+    facts, last, first_skipped = mapped
+    with METRICS.timer("stage_seconds", stage="load"):
+        merged = merge_rows(cur_target, FACT_SALES, facts, load_mode)
+        if last and "order_item_id" not in held:
+            save_watermark(cur_target, last[7], last[3], last[8])
+        if first_skipped is not None:
+            held.setdefault("order_item_id", first_skipped)
+        cur_target.connection.commit()
+    METRICS.observe("chunk_rows", merged)
+    return merged
+
+# The backlog probe stops counting here; anything above is "far behind" anyway
+BACKLOG_PROBE_CAP = int(os.getenv("ETL_BACKLOG_PROBE_CAP", "100000"))
+
+def measure_backlog(conn_source, watermark):
+    """Returns (OrderItem rows past the watermark (capped), age in seconds of the oldest pending order)."""
+    cur = conn_source.cursor()
+    cur.execute("""
+        SELECT COUNT(*), COALESCE(EXTRACT(EPOCH FROM NOW() - MIN(o.order_date)), 0)
+        FROM (
+            SELECT order_id FROM OrderItem
+            WHERE order_item_id > %s
+            ORDER BY order_item_id
+            LIMIT %s
+        ) oi
+        JOIN "Order" o ON oi.order_id = o.order_id
+    """, (watermark, BACKLOG_PROBE_CAP))
+    pending, lag = cur.fetchone()
+    cur.close()
+    conn_source.commit()
+    return pending, float(lag)
+
+def run_etl_bridge(full_refresh=False, load_mode=LOAD_MODE, pipeline=PIPELINE, stats=None):
+    """
+    Runs one ETL batch. Returns True on success. If a stats dict is passed it is
+    filled with rows_loaded, source_secs and the backlog left behind
+    (pending_rows, lag_secs) for the scheduler.
+    """
     conn_source = None
     conn_target = None
+    stats = {} if stats is None else stats
+    source_secs = [0.0]
+    batch_started = time.perf_counter()
+    stages_before = METRICS.stage_totals("stage_seconds")
     
     try:
         print("--- Starting ETL Batch ---")
-        conn_source = psycopg2.connect(**SOURCE_CONFIG)
+        conn_source, source_role = connect_source()
+        stats["source"] = source_role
         
         # Create a named cursor for Server-Side iteration
         cur_source = conn_source.cursor(name='server_side_cursor') 
 
+        # Explicit transactions: each fact chunk commits together with its watermark
         conn_target = psycopg2.connect(**TARGET_CONFIG)
-        conn_target.autocommit = True
         cur_target = conn_target.cursor()
 
-        # ... [Rest of your existing extraction logic remains exactly the same] ...
-        
-        # STEP 1: DIMENSIONS 
-        cur_dim_source = conn_source.cursor() 
-
-        # Products
-        # print("Extracting Products...") 
-        cur_dim_source.execute("""
-            SELECT 
-                p.product_id, c.card_name, s.set_name, s.series, c.rarity, p.condition, p.price
-            FROM Product p 
-            JOIN Card c ON p.card_id = c.card_id 
-            JOIN "Set" s ON c.set_id = s.set_id
-        """)
-        products = cur_dim_source.fetchall()
-        
-        cur_target.executemany("""
-            INSERT INTO dim_product (product_id_oltp, card_name, set_name, series_name, rarity, condition, current_price)
-            VALUES (%s, %s, %s, %s, %s, %s, %s)
-            ON CONFLICT (product_id_oltp) DO UPDATE SET 
-                current_price = EXCLUDED.current_price, 
-                condition = EXCLUDED.condition;
-        """, products)
-
-        # Customers
-        # print("Extracting Customers...")
-        cur_dim_source.execute("SELECT customer_id, user_name, first_name || ' ' || last_name FROM Customer")
-        customers = cur_dim_source.fetchall()
-        
-        cur_target.executemany("""
-            INSERT INTO dim_customer (customer_id_oltp, user_name, full_name)
-            VALUES (%s, %s, %s)
-            ON CONFLICT (customer_id_oltp) DO UPDATE SET 
-                user_name = EXCLUDED.user_name, 
-                full_name = EXCLUDED.full_name;
-        """, customers)
-        
-        cur_dim_source.close()
+        ensure_watermark_table(cur_target)
+        if full_refresh:
+            print("Full refresh requested. Re-reading all sales history.")
+            watermark = 0
+        else:
+            watermark = get_watermark(cur_target)
+        conn_target.commit()
+        start_after = max(watermark - WATERMARK_OVERLAP, 0)
 
-        # Date
-        # print("Syncing Date Dimension...")
-        cur_date_source = conn_source.cursor()
-        cur_date_source.execute('SELECT MIN(order_date), MAX(order_date) FROM "Order"')
-        row = cur_date_source.fetchone()
-        cur_date_source.close()
-        
-        min_date = row[0].date() if row and row[0] else date.today()
-        max_date = row[1].date() if row and row[1] else date.today()
-        
-        date_rows = []
-        curr = min_date
-        while curr <= max_date:
-            date_rows.append((
-                int(curr.strftime('%Y%m%d')), curr, curr.isoweekday(), curr.strftime('%A'),
-                curr.month, curr.strftime('%B'), (curr.month - 1) // 3 + 1, curr.year, curr.isoweekday() >= 6
-            ))
-            curr += timedelta(days=1)
-
-        cur_target.executemany("""
-            INSERT INTO dim_date (date_key, full_date, day_of_week, day_name, month, month_name, quarter, year, is_weekend)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
-            ON CONFLICT (date_key) DO NOTHING;
-        """, date_rows)
+        # STEP 1: DIMENSIONS 
+        started = time.perf_counter()
+        dims_changed = sync_dimensions(conn_source, cur_target, load_mode, after_order_item_id=start_after)
+        source_secs[0] += time.perf_counter() - started
 
         # FACT TABLE 
-        cur_target.execute("SELECT product_id_oltp, product_key FROM dim_product")
-        p_map = dict(cur_target.fetchall())
-        
-        cur_target.execute("SELECT customer_id_oltp, customer_key FROM dim_customer")
-        c_map = dict(cur_target.fetchall())
+        p_map, c_map = load_key_maps(cur_target)
 
         # print("Extracting Sales...")
-        cur_source.itersize = 2000 
-        cur_source.execute("""
-            SELECT 
-                to_char(o.order_date, 'YYYYMMDD')::int, oi.product_id, o.customer_id, 
-                o.order_id, oi.quantity, oi.price_at_sale, (oi.quantity * oi.price_at_sale)
-            FROM OrderItem oi 
-            JOIN "Order" o ON oi.order_id = o.order_id
-        """)
+        cur_source.itersize = BATCH_SIZE
+        started = time.perf_counter()
+        cur_source.execute(SALES_SELECT + """
+            WHERE oi.order_item_id > %s
+            ORDER BY oi.order_item_id
+        """, (start_after,))
+        source_secs[0] += time.perf_counter() - started
         
-        batch_buffer = []
-        BATCH_SIZE = 2000
-        total_loaded = 0
-
-        while True:
-            rows = cur_source.fetchmany(BATCH_SIZE)
-            if not rows: break
-            
-            for row in rows:
-                d_key, pid, cid, oid, qty, price, total = row
-                if pid in p_map and cid in c_map:
-                    batch_buffer.append((d_key, p_map[pid], c_map[cid], oid, qty, price, total))
-            
-            if batch_buffer:
-                cur_target.executemany("""
-                    INSERT INTO fact_sales (date_key, product_key, customer_key, order_id, quantity_sold, unit_price, total_revenue)
-                    VALUES (%s, %s, %s, %s, %s, %s, %s)
-                    ON CONFLICT (order_id, product_key) DO UPDATE SET
-                        quantity_sold = EXCLUDED.quantity_sold, 
-                        total_revenue = EXCLUDED.total_revenue,
-                        unit_price = EXCLUDED.unit_price;
-                """, batch_buffer)
-                total_loaded += len(batch_buffer)
-                batch_buffer = [] 
+        def extract_chunks():
+            while True:
+                started = time.perf_counter()
+                rows = cur_source.fetchmany(BATCH_SIZE)
+                elapsed = time.perf_counter() - started
+                source_secs[0] += elapsed
+                METRICS.observe("stage_seconds", elapsed, stage="extract")
+                if not rows: return
+                yield rows
+
+        held = {}
+        if pipeline:
+            # Reader thread -> transform worker(s) -> loader (this thread)
+            total_loaded, gauges = run_pipeline(
+                extract_chunks,
+                lambda rows: transform_sales(rows, p_map, c_map),
+                lambda mapped: load_sales_chunk(cur_target, mapped, load_mode, held),
+                queue_depth=PIPELINE_QUEUE_DEPTH,
+                transform_workers=PIPELINE_WORKERS,
+            )
+            print(f"Pipeline queues: {'; '.join(gauges)}")
+        else:
+            total_loaded = 0
+            for rows in extract_chunks():
+                total_loaded += load_sales_chunk(cur_target, transform_sales(rows, p_map, c_map), load_mode, held)
+
+        if total_loaded or dims_changed:
+            bump_data_version(cur_target)
+            conn_target.commit()
 
         print(f"ETL Batch Completed. Synced {total_loaded} sales rows.")
+        if held:
+            print(f"Watermark held before order_item_id {held['order_item_id']} "
+                  f"(product/customer not in OLAP yet); retried next batch.")
+        print(f"Key maps: {format_key_map_stats(p_map, c_map)}")
+        stats["rows_loaded"] = total_loaded
+
+        cur_source.close()
+        conn_source.commit()
+        started = time.perf_counter()
+        stats["pending_rows"], stats["lag_secs"] = measure_backlog(conn_source, get_watermark(cur_target))
+        source_secs[0] += time.perf_counter() - started
+
+        elapsed = time.perf_counter() - batch_started
+        stages_after = METRICS.stage_totals("stage_seconds")
+        stage_secs = {dict(labels)["stage"]: round(secs - stages_before.get(labels, 0.0), 3)
+                      for labels, secs in stages_after.items()}
+        METRICS.inc("batches_total", outcome="ok")
+        METRICS.inc("rows_loaded_total", total_loaded)
+        METRICS.set("batch_rows", total_loaded)
+        METRICS.set("batch_rows_per_second", round(total_loaded / elapsed, 1) if elapsed else 0)
+        METRICS.set("pending_rows", stats["pending_rows"])
+        METRICS.set("freshness_lag_seconds", round(stats["lag_secs"], 1))
+        METRICS.set("last_success_timestamp_seconds", int(time.time()))
+        log_event("batch", status="ok", source=source_role, rows_loaded=total_loaded, seconds=round(elapsed, 3),
+                  stage_seconds=stage_secs, pending_rows=stats["pending_rows"],
+                  lag_secs=round(stats["lag_secs"], 1), key_maps=[p_map.stats(), c_map.stats()])
+        return True
 
     except Exception as e:
+        if conn_target: conn_target.rollback()
         print(f"ETL Batch Failed: {e}")
+        METRICS.inc("batches_total", outcome="failed")
+        METRICS.inc("errors_total", error=type(e).__name__)
+        log_event("batch", status="failed", error=str(e), seconds=round(time.perf_counter() - batch_started, 3))
+        return False
     finally:
+        stats["source_secs"] = source_secs[0]
         if conn_source: conn_source.close()
         if conn_target: conn_target.close()
 
 # --- UPDATED MAIN EXECUTION LOOP ---
 if __name__ == "__main__":
-    # Default to 60 seconds if not set in docker-compose
-    SLEEP_INTERVAL = int(os.getenv("ETL_INTERVAL", "60"))
+    parser = argparse.ArgumentParser(description="OLTP -> OLAP ETL bridge")
+    parser.add_argument("--full-refresh", action="store_true",
+                        help="Ignore the stored watermark and re-sync all sales history on the first batch")
+    parser.add_argument("--load-mode", choices=LOAD_MODES, default=LOAD_MODE,
+                        help="copy: COPY into a staging table + one set-based merge; executemany: row-by-row upserts")
+    parser.add_argument("--pipeline", action="store_true", default=PIPELINE,
+                        help="Overlap extraction and loading with a reader thread and bounded queues")
+    parser.add_argument("--parallel-backfill", type=int, metavar="WORKERS", default=0,
+                        help="Re-sync all sales history with WORKERS range-partitioned processes before the service loop")
+    parser.add_argument("--copy-backfill", action="store_true",
+                        help="Rebuild fact_sales with a direct binary COPY stream from OLTP before the service loop")
+    args = parser.parse_args()
+
+    if args.copy_backfill:
+        from etl_backfill import run_copy_backfill
+        run_copy_backfill(load_mode=args.load_mode)
+    elif args.parallel_backfill:
+        from etl_backfill import run_parallel_backfill
+        run_parallel_backfill(workers=args.parallel_backfill, load_mode=args.load_mode)
+
+    from report_warmer import REPORT_WARM_BUDGET, warm_report_cache
+    start_metrics_server()
+
+    # ETL_INTERVAL (default 60s) is the base; see etl_scheduler.py for the other knobs
+    scheduler = AdaptiveScheduler()
     
-    print(f"Starting ETL Service. Running every {SLEEP_INTERVAL} seconds.")
+    print(f"Starting ETL Service. Base interval {scheduler.interval}s "
+          f"(min {scheduler.min_interval}s, max {scheduler.max_interval}s, "
+          f"source budget {scheduler.source_budget:.0f}s/min).")
     
+    full_refresh = args.full_refresh
     while True:
+        stats = {}
+        ok = False
         try:
-            run_etl_bridge()
+            ok = run_etl_bridge(full_refresh=full_refresh, load_mode=args.load_mode,
+                                pipeline=args.pipeline, stats=stats)
+            if ok:
+                full_refresh = False
         except Exception as e:
             print(f"CRITICAL ERROR in Loop: {e}")
+
+        # Post-load stage: precompute popular report responses for the new data version
+        if ok and REPORT_WARM_BUDGET > 0:
+            try:
+                warmed, left = warm_report_cache()
+                if warmed or left:
+                    print(f"Report cache: warmed {warmed} requests" + (f", {left} left for next time" if left else ""))
+            except Exception as e:
+                print(f"Report cache warm-up failed: {e}")
         
-        # Sleep to reduce load on DB (Batch processing)
-        time.sleep(SLEEP_INTERVAL)
\ No newline at end of file
+        # Sleep less while behind, back off while idle, and stay within the source budget
+        delay, reason = scheduler.next_delay(ok, stats)
+        print(f"Next batch in {delay:.0f}s ({reason}).")
+        time.sleep(delay)
\ No newline at end of file
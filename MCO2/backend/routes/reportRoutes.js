@@ -1,51 +1,263 @@
 const express = require('express');
 const router = express.Router();
-const { Pool } = require('pg');
+const { Pool, Client } = require('pg');
 
-const olapPool = new Pool({
+const OLAP_CONFIG = {
     user: process.env.DB_USER || 'postgres',
     host: process.env.DB_OLAP_HOST || 'db_olap', 
     database: process.env.DB_OLAP_NAME || 'pokemon_olap', 
     password: process.env.DB_PASSWORD || 'Joshneal2245',
     port: 5432
-});
+};
+const olapPool = new Pool(OLAP_CONFIG);
+
+// Filter columns for queries joining dim_date d and dim_product p
+const DIMENSION_COLUMNS = { year: 'd.year', month: 'd.month', set: 'p.set_name', rarity: 'p.rarity' };
+// fact_sales f (year / month denormalized) JOIN dim_product p
+const FACT_COLUMNS = { year: 'f.year', month: 'f.month', set: 'p.set_name', rarity: 'p.rarity', dateKey: 'f.date_key' };
+// rollup_sales_daily_product r JOIN dim_product p JOIN dim_date d
+const DAILY_PRODUCT_COLUMNS = { ...DIMENSION_COLUMNS, dateKey: 'r.date_key' };
+// fact_orders o JOIN dim_date d
+const ORDER_COLUMNS = { ...DIMENSION_COLUMNS, dateKey: 'o.date_key' };
+// rollup_sales_daily_set_rarity r JOIN dim_date d
+const SET_RARITY_COLUMNS = { year: 'd.year', month: 'd.month', set: 'r.set_name', rarity: 'r.rarity', dateKey: 'r.date_key' };
+// rollup_sales_monthly_set r (no rarity column)
+const MONTHLY_SET_COLUMNS = { year: 'r.year', month: 'r.month', set: 'r.set_name' };
+
+const hasFilter = (value) => value && value !== 'All';
+
+// /revenue-trends buckets and their approximate length in days ('auto' picks the
+// finest one that keeps the series within TREND_TARGET_POINTS points)
+const TREND_BUCKET_DAYS = { day: 1, week: 7, month: 30.44, quarter: 91.31 };
+const TREND_TARGET_POINTS = parseInt(process.env.TREND_TARGET_POINTS || '120');
+
+/**
+ * Rollup that can answer a set-level query: monthly x set unless a rarity filter
+ * forces the daily x set x rarity grain.
+ */
+const setRollupSource = (query) => hasFilter(query.rarity)
+    ? { from: 'rollup_sales_daily_set_rarity r JOIN dim_date d ON r.date_key = d.date_key', columns: SET_RARITY_COLUMNS }
+    : { from: 'rollup_sales_monthly_set r', columns: MONTHLY_SET_COLUMNS };
 
 /**
  * Helper to build dynamic WHERE clauses and parameters
  */
-const buildFilters = (query) => {
+const buildFilters = (query, columns = DIMENSION_COLUMNS) => {
     const conditions = [];
     const params = [];
     let paramIndex = 1;
 
     // Filter by Year (using dim_date)
     if (query.year && query.year !== 'All') {
-        conditions.push(`d.year = $${paramIndex++}`);
+        conditions.push(`${columns.year} = $${paramIndex++}`);
         params.push(parseInt(query.year));
     }
 
     // Filter by Month (using dim_date)
     if (query.month && query.month !== 'All') {
-        conditions.push(`d.month = $${paramIndex++}`);
+        conditions.push(`${columns.month} = $${paramIndex++}`);
         params.push(parseInt(query.month));
     }
 
     // Filter by Set (using dim_product)
     if (query.set && query.set !== 'All') {
-        conditions.push(`p.set_name = $${paramIndex++}`);
+        conditions.push(`${columns.set} = $${paramIndex++}`);
         params.push(query.set);
     }
 
     // Filter by Rarity (Proxy for Card Type)
     if (query.rarity && query.rarity !== 'All') {
-        conditions.push(`p.rarity = $${paramIndex++}`);
+        conditions.push(`${columns.rarity} = $${paramIndex++}`);
         params.push(query.rarity);
     }
 
+    // Same year / month as a date_key range: prunes fact_sales partitions and
+    // uses the (date_key, ...) primary keys of the daily rollups
+    if (columns.dateKey && hasFilter(query.year)) {
+        const year = parseInt(query.year);
+        const month = hasFilter(query.month) ? parseInt(query.month) : null;
+        const first = month ? year * 10000 + month * 100 + 1 : year * 10000 + 101;
+        const last = month ? year * 10000 + month * 100 + 31 : year * 10000 + 1231;
+        conditions.push(`${columns.dateKey} BETWEEN $${paramIndex++} AND $${paramIndex++}`);
+        params.push(first, last);
+    }
+
     const whereClause = conditions.length > 0 ? 'WHERE ' + conditions.join(' AND ') : '';
     return { whereClause, params, paramIndex };
 };
 
+// --- Result cache ---
+// Report data only changes when ETL.py / olap_drain.py / cdc_consumer.py load it.
+// Each of them bumps olap_data_version and NOTIFYs olap_data_changed, which
+// clears this cache; results are cached only while that listener is connected.
+// Bodies computed here are also stored in report_cache under their data version,
+// so other API processes (and this one after a restart) can serve them, and
+// request counts go to report_cache_stats. report_warmer.py replays the most
+// requested params through these endpoints after each ETL batch.
+const REPORT_CACHE_SIZE = parseInt(process.env.REPORT_CACHE_SIZE || '500');
+const CACHE_RECONNECT_MS = 5000;
+const STATS_FLUSH_MS = 30000;
+// Set by report_warmer.py; its requests fill the cache but are not counted as demand
+const WARM_HEADER = 'X-Report-Warm';
+const reportCache = new Map(); // key -> Promise of the response body, oldest first
+const cacheStats = { hits: 0, warm_hits: 0, misses: 0, invalidations: 0 };
+const pendingStats = new Map(); // key -> counts not yet flushed to report_cache_stats
+let dataVersion = null; // null while not listening
+
+/**
+ * Normalized request params ('All' when missing, numbers re-stringified) so
+ * equivalent URLs share an entry. They are valid query strings for the same
+ * endpoint, which is how report_warmer.py replays them.
+ */
+const cacheParams = (query, extra = {}) => ({
+    year: hasFilter(query.year) ? String(parseInt(query.year)) : 'All',
+    month: hasFilter(query.month) ? String(parseInt(query.month)) : 'All',
+    set: hasFilter(query.set) ? String(query.set) : 'All',
+    rarity: hasFilter(query.rarity) ? String(query.rarity) : 'All',
+    ...extra
+});
+
+const cacheKey = (endpoint, params) => JSON.stringify([endpoint, params]);
+
+const countRequest = (req, key, endpoint, params, outcome) => {
+    if (req.get(WARM_HEADER)) return;
+    cacheStats[outcome]++;
+    let counts = pendingStats.get(key);
+    if (!counts) {
+        counts = { endpoint, params, hits: 0, warm_hits: 0, misses: 0 };
+        pendingStats.set(key, counts);
+    }
+    counts[outcome]++;
+};
+
+const flushStats = async () => {
+    if (pendingStats.size === 0) return;
+    const batch = [...pendingStats.entries()].map(([cache_key, counts]) => ({ cache_key, ...counts }));
+    pendingStats.clear();
+    try {
+        await olapPool.query(`
+            INSERT INTO report_cache_stats (cache_key, endpoint, params, hits, warm_hits, misses)
+            SELECT * FROM jsonb_to_recordset($1::jsonb) AS s(
+                cache_key TEXT, endpoint TEXT, params JSONB, hits BIGINT, warm_hits BIGINT, misses BIGINT)
+            ON CONFLICT (cache_key) DO UPDATE SET
+                hits = report_cache_stats.hits + EXCLUDED.hits,
+                warm_hits = report_cache_stats.warm_hits + EXCLUDED.warm_hits,
+                misses = report_cache_stats.misses + EXCLUDED.misses,
+                last_requested_at = NOW();
+        `, [JSON.stringify(batch)]);
+    } catch (err) {
+        console.error('Report cache stats flush failed:', err.message);
+    }
+};
+setInterval(flushStats, STATS_FLUSH_MS).unref();
+
+/** Body stored for this exact data version, or undefined. */
+const readStored = async (key, version) => {
+    try {
+        const result = await olapPool.query(
+            'SELECT body FROM report_cache WHERE cache_key = $1 AND version = $2', [key, version]);
+        return result.rows.length ? result.rows[0].body : undefined;
+    } catch (err) {
+        return undefined; // shared tier is best-effort
+    }
+};
+
+const storeBody = (key, endpoint, params, version, body, computeMs) => {
+    olapPool.query(`
+        INSERT INTO report_cache (cache_key, endpoint, params, version, body, compute_ms)
+        VALUES ($1, $2, $3, $4, $5, $6)
+        ON CONFLICT (cache_key) DO UPDATE SET
+            params = EXCLUDED.params, version = EXCLUDED.version, body = EXCLUDED.body,
+            compute_ms = EXCLUDED.compute_ms, computed_at = NOW()
+        WHERE report_cache.version <= EXCLUDED.version;
+    `, [key, endpoint, JSON.stringify(params), version, JSON.stringify(body), computeMs])
+        .catch((err) => console.error('Report cache store failed:', err.message));
+};
+
+/**
+ * Returns the cached promise for (endpoint, params), or runs compute() and caches
+ * it. Pending promises are shared, so identical concurrent requests run the
+ * queries once; failures are not kept.
+ */
+const cached = (req, endpoint, params, compute) => {
+    const key = cacheKey(endpoint, params);
+    if (dataVersion === null || REPORT_CACHE_SIZE <= 0) {
+        countRequest(req, key, endpoint, params, 'misses');
+        return compute();
+    }
+
+    const hit = reportCache.get(key);
+    if (hit) {
+        countRequest(req, key, endpoint, params, 'hits');
+        reportCache.delete(key); // move to the most recently used end
+        reportCache.set(key, hit);
+        return hit;
+    }
+
+    const version = dataVersion;
+    const promise = readStored(key, version).then(async (stored) => {
+        if (stored !== undefined) {
+            countRequest(req, key, endpoint, params, 'warm_hits');
+            return stored;
+        }
+        countRequest(req, key, endpoint, params, 'misses');
+        const started = Date.now();
+        const body = await compute();
+        // Only store what was certainly computed against this version
+        if (dataVersion === version) storeBody(key, endpoint, params, version, body, Date.now() - started);
+        return body;
+    });
+    reportCache.set(key, promise);
+    if (reportCache.size > REPORT_CACHE_SIZE) {
+        reportCache.delete(reportCache.keys().next().value);
+    }
+    promise.catch(() => {
+        if (reportCache.get(key) === promise) reportCache.delete(key);
+    });
+    return promise;
+};
+
+const setDataVersion = (version) => {
+    if (version !== dataVersion) {
+        if (reportCache.size > 0) cacheStats.invalidations++;
+        reportCache.clear();
+    }
+    dataVersion = version;
+};
+
+/**
+ * LISTENs for olap_data_changed on a dedicated connection. If it drops, caching
+ * is switched off (writes could be missed) until the reconnect succeeds.
+ */
+const listenForDataChanges = () => {
+    const client = new Client(OLAP_CONFIG);
+    let retrying = false;
+    const retry = (err) => {
+        if (retrying) return;
+        retrying = true;
+        console.error('Report cache listener disconnected:', err ? err.message : 'connection ended');
+        setDataVersion(null);
+        client.end().catch(() => {});
+        setTimeout(listenForDataChanges, CACHE_RECONNECT_MS);
+    };
+
+    client.on('error', retry);
+    client.on('end', () => retry());
+    client.on('notification', (msg) => setDataVersion(msg.payload));
+
+    client.connect()
+        .then(() => client.query('LISTEN olap_data_changed'))
+        .then(() => client.query('SELECT version FROM olap_data_version'))
+        .then((result) => setDataVersion(String(result.rows[0].version)))
+        .catch(retry);
+};
+
+if (REPORT_CACHE_SIZE > 0) listenForDataChanges();
+
+router.get('/cache-stats', (req, res) => {
+    res.json({ ...cacheStats, entries: reportCache.size, capacity: REPORT_CACHE_SIZE, version: dataVersion });
+});
+
 // --- 1. Filter Options Endpoint ---
 router.get('/filters', async (req, res) => {
     try {
@@ -53,17 +265,19 @@ router.get('/filters', async (req, res) => {
         const setsQuery = `SELECT DISTINCT set_name FROM dim_product ORDER BY set_name ASC`;
         const raritiesQuery = `SELECT DISTINCT rarity FROM dim_product ORDER BY rarity ASC`;
 
-        const [years, sets, rarities] = await Promise.all([
-            olapPool.query(yearsQuery),
-            olapPool.query(setsQuery),
-            olapPool.query(raritiesQuery)
-        ]);
-
-        res.json({
-            years: years.rows.map(r => r.year),
-            sets: sets.rows.map(r => r.set_name),
-            rarities: rarities.rows.map(r => r.rarity)
+        const body = await cached(req, 'filters', {}, async () => {
+            const [years, sets, rarities] = await Promise.all([
+                olapPool.query(yearsQuery),
+                olapPool.query(setsQuery),
+                olapPool.query(raritiesQuery)
+            ]);
+            return {
+                years: years.rows.map(r => r.year),
+                sets: sets.rows.map(r => r.set_name),
+                rarities: rarities.rows.map(r => r.rarity)
+            };
         });
+        res.json(body);
     } catch (err) {
         console.error(err);
         res.status(500).json({ error: 'Failed to fetch filter options' });
@@ -73,22 +287,52 @@ router.get('/filters', async (req, res) => {
 // --- 2. Summary Dashboard (Overview) ---
 router.get('/summary', async (req, res) => {
     try {
-        const { whereClause, params } = buildFilters(req.query);
-
-        const query = `
+        const source = setRollupSource(req.query);
+        const { whereClause, params } = buildFilters(req.query, source.columns);
+        const totalsQuery = `
             SELECT 
-                COALESCE(SUM(f.total_revenue), 0)::float as total_revenue,
-                COALESCE(SUM(f.quantity_sold), 0)::integer as total_units,
-                COUNT(DISTINCT f.order_id)::integer as total_orders,
-                ROUND(AVG(f.unit_price), 2)::float as avg_price
-            FROM fact_sales f
-            JOIN dim_date d ON f.date_key = d.date_key
-            JOIN dim_product p ON f.product_key = p.product_key
+                COALESCE(SUM(r.total_revenue), 0)::float as total_revenue,
+                COALESCE(SUM(r.quantity_sold), 0)::integer as total_units,
+                ROUND(SUM(r.price_sum) / NULLIF(SUM(r.line_count), 0), 2)::float as avg_price
+            FROM ${source.from}
             ${whereClause};
         `;
 
-        const result = await olapPool.query(query, params);
-        res.json(result.rows[0]);
+        // Order counts come from fact_orders (one row per order). A set / rarity filter
+        // selects orders by their lines, which only the line-grain fact can answer.
+        const lineGrain = hasFilter(req.query.set) || hasFilter(req.query.rarity);
+        const orderFilters = buildFilters(req.query, lineGrain ? FACT_COLUMNS : ORDER_COLUMNS);
+        let ordersQuery;
+        if (lineGrain) {
+            ordersQuery = `
+                SELECT
+                    COUNT(DISTINCT f.order_id)::integer as total_orders,
+                    NULL::float as avg_order_value
+                FROM fact_sales f
+                JOIN dim_product p ON f.product_key = p.product_key
+                ${orderFilters.whereClause};
+            `;
+        } else {
+            ordersQuery = `
+                SELECT
+                    COUNT(*)::integer as total_orders,
+                    ROUND(SUM(o.total_revenue) / NULLIF(COUNT(*), 0), 2)::float as avg_order_value
+                FROM fact_orders o
+                JOIN dim_date d ON o.date_key = d.date_key
+                ${orderFilters.whereClause};
+            `;
+        }
+
+        const body = await cached(req, 'summary', cacheParams(req.query), async () => {
+            const [totals, orders] = await Promise.all([
+                olapPool.query(totalsQuery, params),
+                olapPool.query(ordersQuery, orderFilters.params)
+            ]);
+            const { total_revenue, total_units, avg_price } = totals.rows[0];
+            const { total_orders, avg_order_value } = orders.rows[0];
+            return { total_revenue, total_units, total_orders, avg_price, avg_order_value };
+        });
+        res.json(body);
     } catch (err) {
         console.error(err);
         res.status(500).json({ error: 'Summary Query Failed' });
@@ -96,25 +340,64 @@ router.get('/summary', async (req, res) => {
 });
 
 // --- 3. Revenue Trends ---
+// Daily points unless the caller asks for a bucket (or 'auto')
+const trendBucket = (query) =>
+    (query.bucket === 'auto' || Object.keys(TREND_BUCKET_DAYS).includes(query.bucket) ? query.bucket : 'day');
+
+/** Days the series would span: the filtered year / month, else the loaded data. */
+const trendSpanDays = async (query) => {
+    if (hasFilter(query.year)) return hasFilter(query.month) ? 31 : 366;
+    const result = await olapPool.query(
+        'SELECT MIN(date_key) AS first_key, MAX(date_key) AS last_key FROM rollup_sales_daily_set_rarity');
+    const { first_key, last_key } = result.rows[0];
+    if (!first_key) return 0;
+    const toTime = (key) => Date.UTC(Math.floor(key / 10000), Math.floor(key / 100) % 100 - 1, key % 100);
+    const days = (toTime(last_key) - toTime(first_key)) / 86400000 + 1;
+    return hasFilter(query.month) ? days / 12 : days;
+};
+
+const pickTrendBucket = (spanDays) =>
+    Object.keys(TREND_BUCKET_DAYS).find(b => spanDays / TREND_BUCKET_DAYS[b] <= TREND_TARGET_POINTS) || 'quarter';
+
+/**
+ * Month and quarter buckets come from the monthly x set rollup unless a rarity
+ * filter forces the daily x set x rarity grain; full_date is the bucket start.
+ */
+const trendQuery = (query, bucket) => {
+    let from, columns, bucketDate;
+    if ((bucket === 'month' || bucket === 'quarter') && !hasFilter(query.rarity)) {
+        from = 'rollup_sales_monthly_set r';
+        columns = MONTHLY_SET_COLUMNS;
+        bucketDate = bucket === 'month' ? 'make_date(r.year, r.month, 1)' : 'make_date(r.year, (r.month - 1) / 3 * 3 + 1, 1)';
+    } else {
+        from = 'rollup_sales_daily_set_rarity r JOIN dim_date d ON r.date_key = d.date_key';
+        columns = SET_RARITY_COLUMNS;
+        bucketDate = bucket === 'day' ? 'd.full_date' : `date_trunc('${bucket}', d.full_date)::date`;
+    }
+    const { whereClause, params } = buildFilters(query, columns);
+    const text = `
+        SELECT 
+            ${bucketDate} as full_date, 
+            SUM(r.total_revenue)::float as total_revenue,
+            SUM(r.quantity_sold)::integer as total_quantity
+        FROM ${from}
+        ${whereClause}
+        GROUP BY 1 
+        HAVING SUM(r.line_count) > 0
+        ORDER BY 1 ASC;
+    `;
+    return { text, params };
+};
+
 router.get('/revenue-trends', async (req, res) => {
     try {
-        const { whereClause, params } = buildFilters(req.query);
-        
-        const query = `
-            SELECT 
-                d.full_date, 
-                SUM(f.total_revenue)::float as total_revenue,
-                SUM(f.quantity_sold)::integer as total_quantity
-            FROM fact_sales f 
-            JOIN dim_date d ON f.date_key = d.date_key 
-            JOIN dim_product p ON f.product_key = p.product_key
-            ${whereClause}
-            GROUP BY d.full_date 
-            ORDER BY d.full_date ASC;
-        `;
-        
-        const result = await olapPool.query(query, params);
-        res.json(result.rows);
+        const requested = trendBucket(req.query);
+        const rows = await cached(req, 'revenue-trends', cacheParams(req.query, { bucket: requested }), async () => {
+            const bucket = requested === 'auto' ? pickTrendBucket(await trendSpanDays(req.query)) : requested;
+            const { text, params } = trendQuery(req.query, bucket);
+            return (await olapPool.query(text, params)).rows;
+        });
+        res.json(rows);
     } catch (err) {
         console.error(err);
         res.status(500).json({ error: 'Revenue Query Failed' });
@@ -124,24 +407,27 @@ router.get('/revenue-trends', async (req, res) => {
 // --- 4. Top Products (Sorted) ---
 router.get('/top-products', async (req, res) => {
     try {
-        const { whereClause, params } = buildFilters(req.query);
+        const { whereClause, params } = buildFilters(req.query, DAILY_PRODUCT_COLUMNS);
         const sortBy = req.query.sortBy === 'revenue' ? 'total_revenue' : 'quantity_sold';
 
         const query = `
             SELECT 
                 p.card_name, 
-                SUM(f.quantity_sold)::integer as quantity_sold,
-                SUM(f.total_revenue)::float as total_revenue
-            FROM fact_sales f 
-            JOIN dim_product p ON f.product_key = p.product_key 
-            JOIN dim_date d ON f.date_key = d.date_key
+                SUM(r.quantity_sold)::integer as quantity_sold,
+                SUM(r.total_revenue)::float as total_revenue
+            FROM rollup_sales_daily_product r 
+            JOIN dim_product p ON r.product_key = p.product_key 
+            JOIN dim_date d ON r.date_key = d.date_key
             ${whereClause}
             GROUP BY p.card_name 
+            HAVING SUM(r.line_count) > 0
             ORDER BY ${sortBy} DESC 
             LIMIT 10;
         `;
-        const result = await olapPool.query(query, params);
-        res.json(result.rows);
+        const sortParam = sortBy === 'total_revenue' ? 'revenue' : 'quantity';
+        const rows = await cached(req, 'top-products', cacheParams(req.query, { sortBy: sortParam }),
+            async () => (await olapPool.query(query, params)).rows);
+        res.json(rows);
     } catch (err) {
         console.error(err);
         res.status(500).json({ error: 'Top Products Query Failed' });
@@ -151,22 +437,23 @@ router.get('/top-products', async (req, res) => {
 // --- 5. Sales by Set ---
 router.get('/sales-by-set', async (req, res) => {
     try {
-        const { whereClause, params } = buildFilters(req.query);
+        const source = setRollupSource(req.query);
+        const { whereClause, params } = buildFilters(req.query, source.columns);
         
         const query = `
             SELECT 
-                p.set_name, 
-                SUM(f.total_revenue)::float as total_revenue,
-                SUM(f.quantity_sold)::integer as quantity_sold
-            FROM fact_sales f 
-            JOIN dim_product p ON f.product_key = p.product_key 
-            JOIN dim_date d ON f.date_key = d.date_key
+                r.set_name, 
+                SUM(r.total_revenue)::float as total_revenue,
+                SUM(r.quantity_sold)::integer as quantity_sold
+            FROM ${source.from}
             ${whereClause}
-            GROUP BY p.set_name
+            GROUP BY r.set_name
+            HAVING SUM(r.line_count) > 0
             ORDER BY total_revenue DESC;
         `;
-        const result = await olapPool.query(query, params);
-        res.json(result.rows);
+        const rows = await cached(req, 'sales-by-set', cacheParams(req.query),
+            async () => (await olapPool.query(query, params)).rows);
+        res.json(rows);
     } catch (err) {
         console.error(err);
         res.status(500).json({ error: 'Set Query Failed' });
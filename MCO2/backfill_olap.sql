@@ -26,6 +26,6 @@ FROM OrderItem oi
 JOIN "Order" o ON oi.order_id = o.order_id
 JOIN dim_product dp ON dp.product_id_oltp = oi.product_id
 JOIN dim_customer dc ON dc.customer_id_oltp = o.customer_id
-ON CONFLICT (order_id, product_key) DO NOTHING;
+ON CONFLICT (order_id, product_key, date_key) DO NOTHING;
 
 RAISE NOTICE 'OLAP Backfill Completed Successfully.';
\ No newline at end of file
@@ -0,0 +1,160 @@
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+import psycopg2
+
+from ETL import TARGET_CONFIG
+
+BENCH_SCHEMA = "olap_bench"
+
+# (table, serial column that needs its own identity in the scratch copy)
+BENCH_TABLES = [
+    ("dim_date", None),
+    ("dim_product", "product_key"),
+    ("dim_customer", "customer_key"),
+    ("fact_sales", "sales_id"),
+    ('"Order"', None),
+    ("OrderItem", None),
+    ("pending_sales", "pending_id"),
+]
+
+TRIGGERS = {
+    # Original per-row path: lookups + upsert for every replicated row
+    "row": [
+        ("OrderItem", "sync_fact_sales_forward"),
+        ('"Order"', "sync_backfill_sales"),
+    ],
+    # Queue path: one append per row, facts built later by drain_pending_sales()
+    "queue": [
+        ("OrderItem", "queue_pending_sales"),
+        ('"Order"', "queue_pending_sales"),
+    ],
+}
+
+def setup_schema(cur, mode, products, customers):
+    """Builds a scratch copy of the OLAP tables so the benchmark never touches live data."""
+    cur.execute(f"DROP SCHEMA IF EXISTS {BENCH_SCHEMA} CASCADE; CREATE SCHEMA {BENCH_SCHEMA};")
+    for table, identity_col in BENCH_TABLES:
+        cur.execute(f"CREATE TABLE {BENCH_SCHEMA}.{table} (LIKE public.{table} INCLUDING INDEXES);")
+        if identity_col:
+            cur.execute(f"ALTER TABLE {BENCH_SCHEMA}.{table} ALTER COLUMN {identity_col} ADD GENERATED BY DEFAULT AS IDENTITY;")
+
+    cur.execute(f"INSERT INTO {BENCH_SCHEMA}.dim_date SELECT * FROM public.dim_date;")
+    cur.execute(f"""
+        INSERT INTO {BENCH_SCHEMA}.dim_product (product_id_oltp, card_name, set_name, series_name, rarity, condition, current_price)
+        SELECT i, 'Card ' || i, 'Set ' || (i % 20), 'Series', 'Common', 'Near Mint', 1.00
+        FROM generate_series(1, %s) i;
+    """, (products,))
+    cur.execute(f"""
+        INSERT INTO {BENCH_SCHEMA}.dim_customer (customer_id_oltp, user_name, full_name)
+        SELECT i, 'user' || i, 'Bench User ' || i FROM generate_series(1, %s) i;
+    """, (customers,))
+
+    for table, function in TRIGGERS[mode]:
+        cur.execute(f"""
+            CREATE TRIGGER trg_bench_{function}_{table.strip('"').lower()} AFTER INSERT ON {BENCH_SCHEMA}.{table}
+            FOR EACH ROW EXECUTE FUNCTION public.{function}();
+        """)
+
+    # Trigger bodies use unqualified names, so they resolve to the scratch tables
+    cur.execute(f"SET search_path = {BENCH_SCHEMA}, public;")
+    cur.connection.commit()
+
+def generate_orders(num_orders, items_per_order, products, customers, seed):
+    """Deterministic synthetic checkouts: [(order_row, [item_rows])]."""
+    rng = random.Random(seed)
+    start = datetime(2024, 1, 1)
+    orders = []
+    item_id = 1
+    for order_id in range(1, num_orders + 1):
+        order_date = start + timedelta(minutes=rng.randrange(365 * 24 * 60))
+        order = (order_id, rng.randint(1, customers), order_date, 'Pending', 0)
+        items = []
+        for product_id in rng.sample(range(1, products + 1), items_per_order):
+            items.append((item_id, order_id, product_id, rng.randint(1, 4), 1.00))
+            item_id += 1
+        orders.append((order, items))
+    return orders
+
+def apply_orders(cur, orders):
+    """Replays each checkout as its own transaction, like the subscriber's apply worker."""
+    for order, items in orders:
+        cur.execute('INSERT INTO "Order" (order_id, customer_id, order_date, status, total_amt) VALUES (%s, %s, %s, %s, %s)', order)
+        for item in items:
+            cur.execute("INSERT INTO OrderItem (order_item_id, order_id, product_id, quantity, price_at_sale) VALUES (%s, %s, %s, %s, %s)", item)
+        cur.connection.commit()
+
+def drain_queue(cur, batch):
+    """
+    Drains until a pass merges nothing, like olap_drain.drain_once (which is not
+    reused because it bumps the live olap_data_version). Orders still waiting
+    for their dimensions stay queued, so an empty queue is not the stop signal.
+    """
+    while True:
+        cur.execute("SELECT drain_pending_sales(%s)", (batch,))
+        merged = cur.fetchone()[0]
+        cur.connection.commit()
+        if not merged:
+            return
+
+def run_mode(mode, orders, args):
+    conn = psycopg2.connect(**TARGET_CONFIG)
+    cur = conn.cursor()
+    try:
+        setup_schema(cur, mode, args.products, args.customers)
+        rows = sum(1 + len(items) for _, items in orders)
+
+        start = time.perf_counter()
+        apply_orders(cur, orders)
+        apply_secs = time.perf_counter() - start
+
+        drain_secs = 0.0
+        if mode == "queue":
+            start = time.perf_counter()
+            drain_queue(cur, args.drain_batch)
+            drain_secs = time.perf_counter() - start
+
+        cur.execute("SELECT COUNT(*) FROM fact_sales")
+        facts = cur.fetchone()[0]
+        return {
+            "mode": mode,
+            "rows": rows,
+            "facts": facts,
+            "apply_secs": apply_secs,
+            "drain_secs": drain_secs,
+            "apply_rate": rows / apply_secs if apply_secs else 0,
+            "end_to_end_rate": rows / (apply_secs + drain_secs) if apply_secs + drain_secs else 0,
+        }
+    finally:
+        conn.rollback()
+        if not args.keep:
+            cur.execute(f"DROP SCHEMA IF EXISTS {BENCH_SCHEMA} CASCADE;")
+            conn.commit()
+        conn.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare per-row OLAP fact triggers with the pending_sales queue")
+    parser.add_argument("--orders", type=int, default=2000)
+    parser.add_argument("--items-per-order", type=int, default=3)
+    parser.add_argument("--products", type=int, default=5000)
+    parser.add_argument("--customers", type=int, default=1000)
+    parser.add_argument("--drain-batch", type=int, default=10000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--keep", action="store_true", help=f"Keep the {BENCH_SCHEMA} schema for inspection")
+    args = parser.parse_args()
+
+    orders = generate_orders(args.orders, args.items_per_order, args.products, args.customers, args.seed)
+
+    results = [run_mode(mode, orders, args) for mode in ("row", "queue")]
+
+    print(f"{'mode':<8}{'rows':>8}{'facts':>8}{'apply s':>10}{'drain s':>10}{'apply rows/s':>15}{'e2e rows/s':>13}")
+    for r in results:
+        print(f"{r['mode']:<8}{r['rows']:>8}{r['facts']:>8}{r['apply_secs']:>10.2f}{r['drain_secs']:>10.2f}"
+              f"{r['apply_rate']:>15.0f}{r['end_to_end_rate']:>13.0f}")
+
+    if results[0]["facts"] != results[1]["facts"]:
+        print("WARNING: fact row counts differ between modes.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+def covered_range(cur):
+    """
+    Returns (first, last, contiguous) for the dates already in dim_date, or
+    (None, None, True) when it is empty. A single aggregate over the small
+    dim_date table; no source scan involved.
+    """
+    cur.execute("SELECT MIN(full_date), MAX(full_date), COUNT(*) FROM dim_date")
+    first, last, count = cur.fetchone()
+    if first is None:
+        return None, None, True
+    return first, last, count == (last - first).days + 1
+
+def fill_dates(cur, first, last):
+    """Inserts every calendar day in [first, last] with one generate_series statement. Returns rows added."""
+    cur.execute("""
+        INSERT INTO dim_date (date_key, full_date, day_of_week, day_name, month, month_name, quarter, year, is_weekend)
+        SELECT
+            to_char(datum, 'YYYYMMDD')::INT,
+            datum,
+            EXTRACT(ISODOW FROM datum),
+            to_char(datum, 'FMDay'),
+            EXTRACT(MONTH FROM datum),
+            to_char(datum, 'FMMonth'),
+            EXTRACT(QUARTER FROM datum),
+            EXTRACT(YEAR FROM datum),
+            EXTRACT(ISODOW FROM datum) IN (6, 7)
+        FROM (
+            SELECT ts::date AS datum
+            FROM generate_series(%s::date, %s::date, INTERVAL '1 day') AS g(ts)
+        ) d
+        ON CONFLICT (date_key) DO NOTHING;
+    """, (first, last))
+    return cur.rowcount
+
+def ensure_calendar(cur, first, last):
+    """
+    Makes dim_date cover [first, last]. Does nothing when the range is already
+    covered; otherwise only the missing days are generated. A non-contiguous
+    dim_date (single dates added by the triggers) is filled across the union.
+    Returns rows added.
+    """
+    if first is None or last is None:
+        return 0
+    have_first, have_last, contiguous = covered_range(cur)
+    if have_first is None:
+        return fill_dates(cur, first, last)
+    if contiguous and have_first <= first and last <= have_last:
+        return 0
+    if not contiguous:
+        return fill_dates(cur, min(first, have_first), max(last, have_last))
+
+    added = 0
+    if first < have_first:
+        added += fill_dates(cur, first, have_first)
+    if last > have_last:
+        added += fill_dates(cur, have_last, last)
+    return added
@@ -0,0 +1,385 @@
+"""
+Change-data-capture consumer for the OLAP star schema.
+
+Streams the olap_source_pub tables from a dedicated logical replication slot
+(pgoutput plugin), groups the decoded changes by commit, and applies each
+micro-batch to dim_customer / dim_product / fact_sales with set-based merges.
+
+The slot's flush_lsn is only acknowledged after the OLAP transaction commits,
+and the applied LSN is stored in cdc_progress inside that same transaction, so
+a restart replays at most the un-acknowledged tail and skips anything already
+applied.
+
+This replaces both the ETL.py polling loop and the olap_sub subscription
+triggers; disable the subscription (ALTER SUBSCRIPTION olap_sub DISABLE) before
+running it against the same OLAP database.
+"""
+import os
+import select
+import struct
+import time
+import psycopg2
+import psycopg2.errors
+import psycopg2.extras
+
+from ETL import SOURCE_CONFIG, TARGET_CONFIG, DIM_CUSTOMER, DIM_PRODUCT, FACT_SALES, LOAD_MODE, bump_data_version
+from etl_loader import _conflict_clause, merge_rows, rows_to_copy_buffer
+from calendar_dim import ensure_calendar
+from fact_partitions import ensure_partitions
+
+SLOT_NAME = os.getenv("CDC_SLOT_NAME", "olap_cdc_slot")
+PUBLICATION = os.getenv("CDC_PUBLICATION", "olap_source_pub")
+BATCH_ROWS = int(os.getenv("CDC_BATCH_ROWS", "5000"))
+BATCH_SECONDS = float(os.getenv("CDC_BATCH_SECONDS", "1.0"))
+
+# ==========================================
+# pgoutput (protocol v1) decoding
+# ==========================================
+class PgOutputDecoder:
+    """Decodes pgoutput messages into (kind, ...) tuples. Keeps the relation cache."""
+
+    def __init__(self):
+        self.relations = {}  # relid -> (table_name, [column names])
+
+    def decode(self, payload):
+        self.buf = payload
+        self.pos = 1
+        kind = payload[:1]
+
+        if kind == b"B":
+            final_lsn, _commit_ts, xid = self._unpack(">QqI")
+            return ("begin", final_lsn, xid)
+        if kind == b"C":
+            _flags, commit_lsn, end_lsn, _commit_ts = self._unpack(">bQQq")
+            return ("commit", commit_lsn, end_lsn)
+        if kind == b"R":
+            relid, = self._unpack(">I")
+            _namespace = self._string()
+            relname = self._string()
+            _replica_identity, ncols = self._unpack(">bh")
+            columns = []
+            for _ in range(ncols):
+                self._unpack(">b")
+                columns.append(self._string())
+                self._unpack(">Ii")
+            self.relations[relid] = (relname.lower(), columns)
+            return ("relation", relname.lower())
+        if kind == b"I":
+            relid, _new = self._unpack(">Ic")
+            return ("insert", self.relations[relid][0], self._tuple(relid))
+        if kind == b"U":
+            relid, marker = self._unpack(">Ic")
+            if marker in (b"K", b"O"):
+                self._tuple(relid)  # old key / old row, not needed
+                self._unpack(">c")
+            return ("update", self.relations[relid][0], self._tuple(relid))
+        if kind == b"D":
+            relid, _marker = self._unpack(">Ic")
+            return ("delete", self.relations[relid][0], self._tuple(relid))
+        if kind == b"T":
+            return ("truncate",)
+        return ("other",)  # Type ('Y') and Origin ('O') messages
+
+    def _unpack(self, fmt):
+        values = struct.unpack_from(fmt, self.buf, self.pos)
+        self.pos += struct.calcsize(fmt)
+        return values
+
+    def _string(self):
+        end = self.buf.index(b"\0", self.pos)
+        value = self.buf[self.pos:end].decode("utf-8")
+        self.pos = end + 1
+        return value
+
+    def _tuple(self, relid):
+        """TupleData -> {column: text value or None}."""
+        columns = self.relations[relid][1]
+        ncols, = self._unpack(">h")
+        row = {}
+        for i in range(ncols):
+            kind, = self._unpack(">c")
+            if kind == b"t":
+                length, = self._unpack(">i")
+                row[columns[i]] = self.buf[self.pos:self.pos + length].decode("utf-8")
+                self.pos += length
+            else:  # 'n' null, 'u' unchanged TOAST value
+                row[columns[i]] = None
+        return row
+
+# ==========================================
+# Micro-batch of committed transactions
+# ==========================================
+class ChangeBatch:
+    """Latest image per key of every row touched by the transactions in this batch."""
+
+    def __init__(self):
+        self.customers = {}
+        self.product_ids = set()
+        self.card_ids = set()
+        self.set_ids = set()
+        self.orders = {}
+        self.order_items = {}
+        self.changes = 0
+        self.ignored = 0
+        self.end_lsn = 0
+        self.started = None
+
+    def add(self, action, table, row):
+        if self.started is None:
+            self.started = time.monotonic()
+        self.changes += 1
+
+        if action == "delete":
+            # Facts are keyed by (order_id, product_key); a delete only carries the
+            # replica identity (the OLTP PK), so it cannot be mapped back safely.
+            self.ignored += 1
+        elif table == "customer":
+            self.customers[int(row["customer_id"])] = row
+        elif table == "product":
+            self.product_ids.add(int(row["product_id"]))
+        elif table == "card":
+            self.card_ids.add(int(row["card_id"]))
+        elif table == "set":
+            self.set_ids.add(int(row["set_id"]))
+        elif table == "order":
+            self.orders[int(row["order_id"])] = row
+        elif table == "orderitem":
+            self.order_items[int(row["order_item_id"])] = row
+        else:
+            self.ignored += 1
+
+    def is_due(self):
+        if self.started is None:
+            return False
+        return self.changes >= BATCH_ROWS or time.monotonic() - self.started >= BATCH_SECONDS
+
+# ==========================================
+# Apply to the star schema
+# ==========================================
+def ensure_progress_table(cur):
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS cdc_progress (
+            slot_name VARCHAR(100) PRIMARY KEY,
+            applied_lsn BIGINT NOT NULL,
+            updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+        );
+        CREATE TABLE IF NOT EXISTS cdc_pending_sales (
+            order_item_id INT PRIMARY KEY,
+            order_id INT NOT NULL,
+            product_id INT,
+            customer_id INT,
+            order_date TIMESTAMPTZ,
+            quantity INT,
+            price NUMERIC(10, 4)
+        );
+    """)
+
+def get_applied_lsn(cur):
+    cur.execute("SELECT applied_lsn FROM cdc_progress WHERE slot_name = %s", (SLOT_NAME,))
+    row = cur.fetchone()
+    return row[0] if row else 0
+
+def apply_batch(conn_target, conn_source, batch):
+    """
+    Applies one micro-batch in a single OLAP transaction. Returns (fact rows
+    merged, lines waiting in cdc_pending_sales for their product / customer).
+    """
+    cur = conn_target.cursor()
+    cur_src = conn_source.cursor()
+
+    # Dimensions first so the fact merge can resolve keys
+    customers = [
+        (cid, r["user_name"], f"{r['first_name']} {r['last_name']}")
+        for cid, r in batch.customers.items()
+    ]
+    merge_rows(cur, DIM_CUSTOMER, customers, LOAD_MODE)
+
+    if batch.product_ids or batch.card_ids or batch.set_ids:
+        # Card/Set changes fan out to every product that uses them
+        cur_src.execute("""
+            SELECT p.product_id, c.card_name, s.set_name, s.series, c.rarity, p.condition, p.price
+            FROM Product p
+            JOIN Card c ON p.card_id = c.card_id
+            JOIN "Set" s ON c.set_id = s.set_id
+            WHERE p.product_id = ANY(%s) OR c.card_id = ANY(%s) OR s.set_id = ANY(%s)
+        """, (list(batch.product_ids), list(batch.card_ids), list(batch.set_ids)))
+        merge_rows(cur, DIM_PRODUCT, cur_src.fetchall(), LOAD_MODE)
+
+    # Orders whose header changed without their lines: re-read the lines so the facts follow
+    items = dict(batch.order_items)
+    header_only = batch.orders.keys() - {int(r["order_id"]) for r in items.values()}
+    if header_only:
+        cur_src.execute("""
+            SELECT order_item_id, order_id, product_id, quantity, price_at_sale FROM OrderItem
+            WHERE order_id = ANY(%s)
+        """, (list(header_only),))
+        for item_id, oid, pid, qty, price in cur_src.fetchall():
+            items.setdefault(item_id, {"order_id": oid, "product_id": pid, "quantity": qty, "price_at_sale": price})
+
+    orders = {oid: (r["customer_id"], r["order_date"]) for oid, r in batch.orders.items()}
+    missing = {int(r["order_id"]) for r in items.values()} - orders.keys()
+    if missing:
+        cur_src.execute('SELECT order_id, customer_id, order_date FROM "Order" WHERE order_id = ANY(%s)',
+                        (list(missing),))
+        for oid, cid, odate in cur_src.fetchall():
+            orders[oid] = (cid, odate)
+
+    sales = []
+    for item_id, r in sorted(items.items()):
+        header = orders.get(int(r["order_id"]))
+        if header:
+            sales.append((item_id, r["order_id"], r["product_id"], header[0], header[1],
+                          r["quantity"], r["price_at_sale"]))
+
+    cur.execute("""
+        CREATE TEMP TABLE IF NOT EXISTS _cdc_sales (
+            order_item_id INT, order_id INT, product_id INT, customer_id INT,
+            order_date TIMESTAMPTZ, quantity INT, price NUMERIC(10, 4)
+        );
+        TRUNCATE _cdc_sales;
+    """)
+    cur.copy_expert("COPY _cdc_sales FROM STDIN", rows_to_copy_buffer(sales))
+    # Lines an earlier batch could not resolve are retried with every batch; this
+    # batch's image of a line wins over the queued one
+    cur.execute("""
+        INSERT INTO _cdc_sales
+        SELECT order_item_id, order_id, product_id, customer_id, order_date, quantity, price
+        FROM cdc_pending_sales p
+        WHERE NOT EXISTS (SELECT 1 FROM _cdc_sales s WHERE s.order_item_id = p.order_item_id);
+        DELETE FROM cdc_pending_sales;
+    """)
+
+    # Calendar days and monthly partitions for the batch's dates, as ETL.sync_dimensions does
+    cur.execute("SELECT MIN(order_date)::DATE, MAX(order_date)::DATE FROM _cdc_sales")
+    first, last = cur.fetchone()
+    ensure_calendar(cur, first, last)
+    ensure_partitions(cur, first, last)
+    cur.execute(f"""
+        INSERT INTO fact_sales ({", ".join(FACT_SALES.columns)})
+        SELECT DISTINCT ON (s.order_id, dp.product_key)
+            to_char(s.order_date, 'YYYYMMDD')::INT, dp.product_key, dc.customer_key,
+            s.order_id, s.quantity, s.price, s.quantity * s.price
+        FROM _cdc_sales s
+        JOIN dim_product dp ON dp.product_id_oltp = s.product_id
+        JOIN dim_customer dc ON dc.customer_id_oltp = s.customer_id
+        ORDER BY s.order_id, dp.product_key, s.order_item_id DESC
+        {_conflict_clause(FACT_SALES)};
+    """)
+    facts = cur.rowcount
+
+    # Lines whose product / customer is not in the dimensions yet are kept for the
+    # next batch, so acknowledging this batch's LSN does not drop them
+    cur.execute("""
+        INSERT INTO cdc_pending_sales (order_item_id, order_id, product_id, customer_id, order_date, quantity, price)
+        SELECT s.order_item_id, s.order_id, s.product_id, s.customer_id, s.order_date, s.quantity, s.price
+        FROM _cdc_sales s
+        WHERE NOT EXISTS (SELECT 1 FROM dim_product dp WHERE dp.product_id_oltp = s.product_id)
+           OR NOT EXISTS (SELECT 1 FROM dim_customer dc WHERE dc.customer_id_oltp = s.customer_id);
+    """)
+    waiting = cur.rowcount
+
+    cur.execute("""
+        INSERT INTO cdc_progress (slot_name, applied_lsn, updated_at) VALUES (%s, %s, NOW())
+        ON CONFLICT (slot_name) DO UPDATE SET applied_lsn = EXCLUDED.applied_lsn, updated_at = NOW();
+    """, (SLOT_NAME, batch.end_lsn))
+    if facts or customers or batch.product_ids or batch.card_ids or batch.set_ids:
+        bump_data_version(cur)
+
+    conn_target.commit()
+    conn_source.commit()  # end the read-only snapshot used for lookups
+    cur.close()
+    cur_src.close()
+    return facts, waiting
+
+# ==========================================
+# Replication loop
+# ==========================================
+def open_replication_stream():
+    conn_repl = psycopg2.connect(connection_factory=psycopg2.extras.LogicalReplicationConnection, **SOURCE_CONFIG)
+    cur_repl = conn_repl.cursor()
+    try:
+        cur_repl.create_replication_slot(SLOT_NAME, output_plugin="pgoutput")
+        print(f"Created replication slot '{SLOT_NAME}'.")
+    except psycopg2.errors.DuplicateObject:
+        pass  # resume from the slot's confirmed_flush_lsn
+
+    cur_repl.start_replication(
+        slot_name=SLOT_NAME,
+        decode=False,
+        options={"proto_version": "1", "publication_names": PUBLICATION},
+    )
+    return conn_repl, cur_repl
+
+def run_cdc_consumer():
+    conn_target = psycopg2.connect(**TARGET_CONFIG)
+    conn_source = psycopg2.connect(**SOURCE_CONFIG)
+    conn_repl = None
+
+    try:
+        cur = conn_target.cursor()
+        ensure_progress_table(cur)
+        applied_lsn = get_applied_lsn(cur)
+        conn_target.commit()
+        cur.close()
+
+        conn_repl, cur_repl = open_replication_stream()
+        print(f"CDC consumer streaming '{PUBLICATION}' via slot '{SLOT_NAME}' (applied LSN {applied_lsn}).")
+
+        decoder = PgOutputDecoder()
+        batch = ChangeBatch()
+        txn_changes = []
+
+        while True:
+            msg = cur_repl.read_message()
+            if msg is None:
+                if batch.is_due():
+                    flush_batch(conn_target, conn_source, cur_repl, batch)
+                    batch = ChangeBatch()
+                select.select([cur_repl], [], [], BATCH_SECONDS)
+                continue
+
+            event = decoder.decode(msg.payload)
+            kind = event[0]
+
+            if kind == "begin":
+                txn_changes = []
+            elif kind in ("insert", "update", "delete"):
+                txn_changes.append(event)
+            elif kind == "commit":
+                end_lsn = event[2]
+                if end_lsn <= applied_lsn:
+                    # Replayed after a crash between OLAP commit and the flush ack
+                    cur_repl.send_feedback(flush_lsn=end_lsn)
+                    continue
+                for action, table, row in txn_changes:
+                    batch.add(action, table, row)
+                batch.end_lsn = end_lsn
+                if batch.started is None:
+                    batch.started = time.monotonic()
+                if batch.is_due():
+                    flush_batch(conn_target, conn_source, cur_repl, batch)
+                    batch = ChangeBatch()
+            elif kind == "truncate":
+                print("Ignoring TRUNCATE on a published table.")
+
+    except KeyboardInterrupt:
+        print("CDC consumer stopped.")
+    finally:
+        if conn_repl: conn_repl.close()
+        conn_source.close()
+        conn_target.close()
+
+def flush_batch(conn_target, conn_source, cur_repl, batch):
+    try:
+        facts, waiting = apply_batch(conn_target, conn_source, batch)
+    except Exception:
+        conn_target.rollback()
+        conn_source.rollback()
+        raise
+    # Only acknowledge once the OLAP transaction is durable
+    cur_repl.send_feedback(flush_lsn=batch.end_lsn)
+    print(f"CDC batch applied: {batch.changes} changes, {facts} fact rows, "
+          f"{batch.ignored} ignored, {waiting} lines waiting for dimensions (LSN {batch.end_lsn}).")
+
+if __name__ == "__main__":
+    run_cdc_consumer()
@@ -0,0 +1,318 @@
+import argparse
+import multiprocessing
+import os
+import threading
+import time
+import psycopg2
+
+from ETL import (
+    TARGET_CONFIG, LOAD_MODE, FACT_SALES, SALES_SELECT,
+    connect_source, sync_dimensions, load_key_maps, transform_sales, ensure_watermark_table, save_watermark,
+    bump_data_version,
+)
+from etl_loader import _conflict_clause, merge_rows
+from calendar_dim import ensure_calendar
+from fact_partitions import ensure_partitions
+
+# Orders per range; each range is one independent source read + OLAP commit
+BACKFILL_RANGE_SIZE = int(os.getenv("ETL_BACKFILL_RANGE_SIZE", "50000"))
+BACKFILL_WORKERS = int(os.getenv("ETL_BACKFILL_WORKERS", str(os.cpu_count() or 2)))
+# Read size for the db-to-db COPY stream; memory use stays at this plus the pipe buffer
+COPY_STREAM_BUFFER = int(os.getenv("ETL_COPY_STREAM_BUFFER", str(1024 * 1024)))
+
+def ensure_progress_table(cur):
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS etl_backfill_progress (
+            run_id VARCHAR(100) NOT NULL,
+            range_start INT NOT NULL,
+            range_end INT NOT NULL,
+            status VARCHAR(20) NOT NULL DEFAULT 'pending',
+            rows_loaded INT,
+            updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+            PRIMARY KEY (run_id, range_start)
+        );
+    """)
+
+def plan_ranges(min_id, max_id, range_size):
+    """Splits [min_id, max_id] into inclusive (start, end) order_id ranges."""
+    return [(lo, min(lo + range_size - 1, max_id)) for lo in range(min_id, max_id + 1, range_size)]
+
+# --- Worker process state (one source + one target connection per process) ---
+_worker = {}
+
+def _init_worker(load_mode, source_role):
+    # Same role as the planner: a standby only moves forward, so a worker never
+    # sees less than the snapshot the ranges and final watermark came from
+    conn_source, _ = connect_source(mode=source_role)
+    conn_source.set_session(readonly=True)
+    conn_target = psycopg2.connect(**TARGET_CONFIG)
+    cur_target = conn_target.cursor()
+    p_map, c_map = load_key_maps(cur_target)
+    conn_target.commit()
+    _worker.update(source=conn_source, target=conn_target, p_map=p_map, c_map=c_map, load_mode=load_mode)
+
+def _load_range(job):
+    """Loads one order_id range and marks it done in the same OLAP transaction."""
+    run_id, lo, hi = job
+    conn_source, conn_target = _worker["source"], _worker["target"]
+    start = time.perf_counter()
+    try:
+        with conn_source.cursor() as cur_source:
+            cur_source.execute(SALES_SELECT + " WHERE o.order_id BETWEEN %s AND %s", (lo, hi))
+            rows = cur_source.fetchall()
+        conn_source.commit()
+
+        loaded = 0
+        first_skipped = None
+        with conn_target.cursor() as cur_target:
+            if rows:
+                facts, _, first_skipped = transform_sales(rows, _worker["p_map"], _worker["c_map"])
+                loaded = merge_rows(cur_target, FACT_SALES, facts, _worker["load_mode"])
+            cur_target.execute("""
+                UPDATE etl_backfill_progress SET status = 'done', rows_loaded = %s, updated_at = NOW()
+                WHERE run_id = %s AND range_start = %s
+            """, (loaded, run_id, lo))
+        conn_target.commit()
+        return lo, hi, loaded, first_skipped, time.perf_counter() - start, None
+    except Exception as e:
+        conn_source.rollback()
+        conn_target.rollback()
+        return lo, hi, 0, None, time.perf_counter() - start, str(e)
+
+def run_parallel_backfill(workers=BACKFILL_WORKERS, range_size=BACKFILL_RANGE_SIZE, run_id="default",
+                          restart=False, load_mode=LOAD_MODE):
+    """
+    Re-syncs all sales history by order_id range across worker processes.
+    Progress is kept in etl_backfill_progress, so re-running the same run_id
+    only processes ranges that have not committed yet. Returns True when every
+    range is done.
+    """
+    conn_source, source_role = connect_source()
+    conn_target = psycopg2.connect(**TARGET_CONFIG)
+    try:
+        cur_target = conn_target.cursor()
+        ensure_progress_table(cur_target)
+        ensure_watermark_table(cur_target)
+        if restart:
+            cur_target.execute("DELETE FROM etl_backfill_progress WHERE run_id = %s", (run_id,))
+        conn_target.commit()
+
+        # Dimensions once, up front, so every worker sees the same key maps
+        sync_dimensions(conn_source, cur_target, load_mode)
+
+        cur_source = conn_source.cursor()
+        cur_source.execute('SELECT MIN(order_id), MAX(order_id) FROM "Order"')
+        min_id, max_id = cur_source.fetchone()
+        if min_id is None:
+            conn_source.commit()
+            print("Backfill: no orders in source.")
+            return True
+        # Handover line within the planned ranges, so the watermark never passes
+        # orders that arrived after max_id was read
+        cur_source.execute(SALES_SELECT + " WHERE o.order_id <= %s ORDER BY oi.order_item_id DESC LIMIT 1", (max_id,))
+        last_item = cur_source.fetchone()
+        conn_source.commit()
+
+        # On resume, a last range that grew with new orders is extended and loaded again
+        cur_target.executemany("""
+            INSERT INTO etl_backfill_progress (run_id, range_start, range_end) VALUES (%s, %s, %s)
+            ON CONFLICT (run_id, range_start) DO UPDATE
+            SET range_end = EXCLUDED.range_end, status = 'pending', rows_loaded = NULL, updated_at = NOW()
+            WHERE etl_backfill_progress.range_end < EXCLUDED.range_end;
+        """, [(run_id, lo, hi) for lo, hi in plan_ranges(min_id, max_id, range_size)])
+        cur_target.execute("""
+            SELECT range_start, range_end FROM etl_backfill_progress
+            WHERE run_id = %s AND status <> 'done' ORDER BY range_start
+        """, (run_id,))
+        todo = cur_target.fetchall()
+        conn_target.commit()
+
+        print(f"Backfill '{run_id}': {len(todo)} ranges of {range_size} orders pending, {workers} workers, reading the {source_role}.")
+        start = time.perf_counter()
+        total = 0
+        failed = 0
+        skipped = []  # first order_item_id per range whose product/customer was missing
+        with multiprocessing.Pool(workers, initializer=_init_worker, initargs=(load_mode, source_role)) as pool:
+            for lo, hi, loaded, first_skipped, secs, error in pool.imap_unordered(_load_range, [(run_id, lo, hi) for lo, hi in todo]):
+                if error:
+                    failed += 1
+                    print(f"   Range {lo}-{hi} failed: {error}")
+                else:
+                    total += loaded
+                    if first_skipped is not None:
+                        skipped.append(first_skipped)
+                    print(f"   Range {lo}-{hi}: {loaded} rows in {secs:.1f}s")
+
+        elapsed = time.perf_counter() - start
+        print(f"Backfill '{run_id}' loaded {total} rows in {elapsed:.1f}s ({total / elapsed if elapsed else 0:.0f} rows/s), {failed} ranges failed.")
+        if failed:
+            return False
+
+        # Hand over to the incremental sync from the last line of the planned ranges,
+        # or just before the first skipped line so the incremental sync retries it
+        if skipped:
+            cur_source.execute(SALES_SELECT + " WHERE oi.order_item_id < %s ORDER BY oi.order_item_id DESC LIMIT 1",
+                               (min(skipped),))
+            last_item = cur_source.fetchone()
+            conn_source.commit()
+            print(f"Backfill skipped lines from order_item_id {min(skipped)} (product/customer not in OLAP); "
+                  f"the incremental sync resumes there.")
+        if last_item:
+            save_watermark(cur_target, last_item[7], last_item[3], last_item[8])
+        if total:
+            bump_data_version(cur_target)
+        conn_target.commit()
+        return True
+    finally:
+        conn_source.close()
+        conn_target.close()
+
+# --- Direct COPY stream (OLTP COPY TO STDOUT -> OLAP COPY FROM STDIN) ---
+# Binary COPY needs identical column types on both ends, hence the explicit casts.
+STREAM_SELECT = """
+    SELECT
+        to_char(o.order_date, 'YYYYMMDD')::int, o.order_date::timestamptz, oi.product_id::int,
+        o.customer_id::int, o.order_id::int, oi.quantity::int, oi.price_at_sale::numeric(10,4),
+        oi.order_item_id::int
+    FROM OrderItem oi
+    JOIN "Order" o ON oi.order_id = o.order_id
+"""
+
+def ensure_stream_table(cur):
+    cur.execute("""
+        CREATE UNLOGGED TABLE IF NOT EXISTS stg_sales_stream (
+            date_key INT,
+            order_date TIMESTAMPTZ,
+            product_id INT,
+            customer_id INT,
+            order_id INT,
+            quantity INT,
+            price_at_sale NUMERIC(10, 4),
+            order_item_id INT
+        );
+    """)
+    cur.execute("TRUNCATE stg_sales_stream;")
+
+def stream_copy(conn_source, cur_target, select_sql, table, buffer_size=COPY_STREAM_BUFFER):
+    """
+    Pipes COPY (select_sql) TO STDOUT (FORMAT binary) from the source straight into
+    COPY table FROM STDIN on the target through an OS pipe. Rows are never decoded
+    in Python. Returns the number of rows the target reports as copied.
+    """
+    read_fd, write_fd = os.pipe()
+    reader = os.fdopen(read_fd, "rb", buffering=buffer_size)
+    writer = os.fdopen(write_fd, "wb", buffering=buffer_size)
+    errors = []
+
+    def produce():
+        try:
+            with conn_source.cursor() as cur_source:
+                cur_source.copy_expert(f"COPY ({select_sql}) TO STDOUT (FORMAT binary)", writer, size=buffer_size)
+        except Exception as e:
+            errors.append(e)
+        finally:
+            try:
+                writer.close()  # EOF for the consumer
+            except OSError:
+                pass
+
+    producer = threading.Thread(target=produce, name="copy-stream-source", daemon=True)
+    producer.start()
+    try:
+        cur_target.copy_expert(f"COPY {table} FROM STDIN (FORMAT binary)", reader, size=buffer_size)
+    except Exception as e:
+        reader.close()  # unblocks the producer with a broken pipe if the target failed
+        producer.join()
+        if errors:
+            # The target only saw a truncated stream; the source error is the cause
+            raise errors[0] from e
+        raise
+    reader.close()
+    producer.join()
+    if errors:
+        raise errors[0]
+    return cur_target.rowcount
+
+def run_copy_backfill(load_mode=LOAD_MODE):
+    """
+    Rebuilds fact_sales from the whole OLTP history: one binary COPY stream into
+    the unlogged stg_sales_stream table, then set-based merges into the star
+    schema, all in one OLAP transaction. Returns True on success.
+    """
+    conn_source, _ = connect_source()
+    conn_source.set_session(readonly=True)
+    conn_target = psycopg2.connect(**TARGET_CONFIG)
+    try:
+        cur_target = conn_target.cursor()
+        ensure_watermark_table(cur_target)
+        sync_dimensions(conn_source, cur_target, load_mode)
+
+        start = time.perf_counter()
+        ensure_stream_table(cur_target)
+        copied = stream_copy(conn_source, cur_target, STREAM_SELECT, "stg_sales_stream")
+        conn_source.commit()
+        copy_secs = time.perf_counter() - start
+        print(f"Streamed {copied} sales rows in {copy_secs:.1f}s ({copied / copy_secs if copy_secs else 0:.0f} rows/s)")
+
+        cur_target.execute("""
+            SELECT to_date(MIN(date_key)::text, 'YYYYMMDD'), to_date(MAX(date_key)::text, 'YYYYMMDD')
+            FROM stg_sales_stream
+        """)
+        first, last = cur_target.fetchone()
+        ensure_calendar(cur_target, first, last)
+        ensure_partitions(cur_target, first, last)
+
+        cur_target.execute(f"""
+            INSERT INTO fact_sales ({", ".join(FACT_SALES.columns)})
+            SELECT DISTINCT ON (s.order_id, dp.product_key)
+                s.date_key, dp.product_key, dc.customer_key, s.order_id,
+                s.quantity, s.price_at_sale, s.quantity * s.price_at_sale
+            FROM stg_sales_stream s
+            JOIN dim_product dp ON dp.product_id_oltp = s.product_id
+            JOIN dim_customer dc ON dc.customer_id_oltp = s.customer_id
+            ORDER BY s.order_id, dp.product_key, s.order_item_id DESC
+            {_conflict_clause(FACT_SALES)};
+        """)
+        merged = cur_target.rowcount
+
+        # Hand over to the incremental sync at the last streamed line, or just before
+        # the first line the joins dropped (product/customer not in OLAP) so it is retried
+        cur_target.execute("""
+            SELECT order_item_id, order_id, order_date FROM stg_sales_stream
+            WHERE order_item_id < COALESCE((
+                SELECT MIN(s.order_item_id) FROM stg_sales_stream s
+                WHERE NOT EXISTS (SELECT 1 FROM dim_product dp WHERE dp.product_id_oltp = s.product_id)
+                   OR NOT EXISTS (SELECT 1 FROM dim_customer dc WHERE dc.customer_id_oltp = s.customer_id)
+            ), 2147483647)
+            ORDER BY order_item_id DESC LIMIT 1
+        """)
+        last = cur_target.fetchone()
+        if last:
+            save_watermark(cur_target, *last)
+        cur_target.execute("TRUNCATE stg_sales_stream;")
+        if merged:
+            bump_data_version(cur_target)
+        conn_target.commit()
+        print(f"COPY backfill merged {merged} fact rows in {time.perf_counter() - start:.1f}s.")
+        return True
+    except Exception as e:
+        conn_target.rollback()
+        print(f"COPY backfill failed: {e}")
+        return False
+    finally:
+        conn_source.close()
+        conn_target.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Parallel range-partitioned fact_sales backfill")
+    parser.add_argument("--workers", type=int, default=BACKFILL_WORKERS)
+    parser.add_argument("--range-size", type=int, default=BACKFILL_RANGE_SIZE)
+    parser.add_argument("--run-id", default="default", help="Progress key; re-use it to resume an interrupted backfill")
+    parser.add_argument("--restart", action="store_true", help="Forget the progress of this run id and start over")
+    parser.add_argument("--copy", action="store_true",
+                        help="Single binary COPY stream from OLTP into an OLAP staging table, then set-based merges")
+    args = parser.parse_args()
+    if args.copy:
+        run_copy_backfill()
+    else:
+        run_parallel_backfill(args.workers, args.range_size, args.run_id, args.restart)
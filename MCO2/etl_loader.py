@@ -0,0 +1,99 @@
+import io
+from collections import namedtuple
+
+# A merge target describes one OLAP table the ETL upserts into.
+#   conflict_columns: the unique key used for ON CONFLICT
+#   update_columns:   columns refreshed on conflict (empty -> DO NOTHING)
+MergeTarget = namedtuple("MergeTarget", ["table", "columns", "conflict_columns", "update_columns"])
+
+LOAD_MODES = ("copy", "executemany")
+
+def _conflict_clause(target):
+    """ON CONFLICT clause; rows whose values did not change are left alone (and not counted)."""
+    conflict = ", ".join(target.conflict_columns)
+    if not target.update_columns:
+        return f"ON CONFLICT ({conflict}) DO NOTHING"
+    updates = ", ".join(f"{col} = EXCLUDED.{col}" for col in target.update_columns)
+    current = ", ".join(f"{target.table}.{col}" for col in target.update_columns)
+    excluded = ", ".join(f"EXCLUDED.{col}" for col in target.update_columns)
+    return f"ON CONFLICT ({conflict}) DO UPDATE SET {updates} WHERE ({current}) IS DISTINCT FROM ({excluded})"
+
+def _copy_value(value):
+    """Formats one value for COPY's text format (tab separated, \\N for NULL)."""
+    if value is None:
+        return "\\N"
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    return (str(value)
+            .replace("\\", "\\\\")
+            .replace("\t", "\\t")
+            .replace("\n", "\\n")
+            .replace("\r", "\\r"))
+
+def rows_to_copy_buffer(rows):
+    """Serializes rows into an in-memory buffer ready for COPY ... FROM STDIN."""
+    buf = io.StringIO()
+    for row in rows:
+        buf.write("\t".join(_copy_value(v) for v in row))
+        buf.write("\n")
+    buf.seek(0)
+    return buf
+
+def staging_table(cur, target):
+    """
+    Creates (once per session) and empties a temp table shaped like the target
+    columns, plus _stg_ord numbering the rows in the order they were copied.
+    """
+    name = f"_stg_{target.table}"
+    cur.execute(f"""
+        CREATE TEMP TABLE IF NOT EXISTS {name} AS
+        SELECT {", ".join(target.columns)} FROM {target.table} WITH NO DATA;
+        ALTER TABLE {name} ADD COLUMN IF NOT EXISTS _stg_ord BIGINT GENERATED ALWAYS AS IDENTITY;
+    """)
+    cur.execute(f"TRUNCATE {name} RESTART IDENTITY;")
+    return name
+
+def copy_merge(cur, target, rows):
+    """
+    Streams rows into a temp staging table with COPY, then merges them into the
+    target with a single set-based INSERT ... SELECT ... ON CONFLICT.
+    Returns the number of rows inserted or changed.
+    """
+    if not rows:
+        return 0
+    columns = ", ".join(target.columns)
+    conflict = ", ".join(target.conflict_columns)
+    stg = staging_table(cur, target)
+
+    cur.copy_expert(f"COPY {stg} ({columns}) FROM STDIN", rows_to_copy_buffer(rows))
+
+    # DISTINCT ON: ON CONFLICT DO UPDATE cannot touch the same key twice in one
+    # statement. The last row for a key wins, as it does with executemany.
+    cur.execute(f"""
+        INSERT INTO {target.table} ({columns})
+        SELECT DISTINCT ON ({conflict}) {columns} FROM {stg}
+        ORDER BY {conflict}, _stg_ord DESC
+        {_conflict_clause(target)};
+    """)
+    return cur.rowcount
+
+def executemany_merge(cur, target, rows):
+    """
+    Row-at-a-time upsert (one round trip per row). Kept as a fallback load mode.
+    Returns the number of rows inserted or changed (rowcount summed over the rows).
+    """
+    if not rows:
+        return 0
+    placeholders = ", ".join(["%s"] * len(target.columns))
+    cur.executemany(f"""
+        INSERT INTO {target.table} ({", ".join(target.columns)})
+        VALUES ({placeholders})
+        {_conflict_clause(target)};
+    """, rows)
+    return cur.rowcount
+
+def merge_rows(cur, target, rows, load_mode="copy"):
+    """Loads rows into target using the configured load mode."""
+    if load_mode == "copy":
+        return copy_merge(cur, target, rows)
+    return executemany_merge(cur, target, rows)
@@ -0,0 +1,153 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Prometheus text endpoint (GET /metrics); "0" disables it
+ETL_METRICS_PORT = int(os.getenv("ETL_METRICS_PORT", "9108"))
+# JSON-lines event log: a file path, "-" for stdout, or empty to disable
+ETL_LOG_JSON = os.getenv("ETL_LOG_JSON", "")
+
+class Metrics:
+    """
+    Thread-safe counters, gauges and summaries (durations, sizes) rendered in the
+    Prometheus text format. Labels are passed as keyword arguments.
+    """
+
+    def __init__(self, prefix="etl"):
+        self.prefix = prefix
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.gauges = {}
+        self.summaries = {}  # (name, labels) -> [count, sum, last]
+        self.help = {}
+
+    @staticmethod
+    def _key(name, labels):
+        return name, tuple(sorted(labels.items()))
+
+    def describe(self, name, text):
+        self.help[name] = text
+
+    def inc(self, name, value=1, **labels):
+        key = self._key(name, labels)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def set(self, name, value, **labels):
+        with self.lock:
+            self.gauges[self._key(name, labels)] = value
+
+    def observe(self, name, value, **labels):
+        key = self._key(name, labels)
+        with self.lock:
+            summary = self.summaries.setdefault(key, [0, 0.0, 0.0])
+            summary[0] += 1
+            summary[1] += value
+            summary[2] = value
+
+    @contextmanager
+    def timer(self, name, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    def stage_totals(self, name):
+        """{label values: summed seconds} for one summary, e.g. per-stage durations."""
+        with self.lock:
+            return {labels: s[1] for (n, labels), s in self.summaries.items() if n == name}
+
+    def render(self):
+        def fmt(name, labels, value):
+            label_text = ",".join(f'{k}="{v}"' for k, v in labels)
+            full = f"{self.prefix}_{name}"
+            return f"{full}{{{label_text}}} {value}" if label_text else f"{full} {value}"
+
+        lines = []
+        with self.lock:
+            for kind, series in (("counter", self.counters), ("gauge", self.gauges)):
+                seen = set()
+                for (name, labels), value in sorted(series.items()):
+                    if name not in seen:
+                        seen.add(name)
+                        if name in self.help:
+                            lines.append(f"# HELP {self.prefix}_{name} {self.help[name]}")
+                        lines.append(f"# TYPE {self.prefix}_{name} {kind}")
+                    lines.append(fmt(name, labels, value))
+            summaries = sorted(self.summaries.items())
+            for name in sorted({name for (name, _), _ in summaries}):
+                if name in self.help:
+                    lines.append(f"# HELP {self.prefix}_{name} {self.help[name]}")
+                lines.append(f"# TYPE {self.prefix}_{name} summary")
+                for (n, labels), (count, total, _) in summaries:
+                    if n == name:
+                        lines.append(fmt(f"{name}_count", labels, count))
+                        lines.append(fmt(f"{name}_sum", labels, f"{total:.6f}"))
+                # A summary family only holds _count / _sum samples; the last value is its own gauge
+                lines.append(f"# HELP {self.prefix}_{name}_last Last observed value of {self.prefix}_{name}")
+                lines.append(f"# TYPE {self.prefix}_{name}_last gauge")
+                for (n, labels), (_, _, last) in summaries:
+                    if n == name:
+                        lines.append(fmt(f"{name}_last", labels, f"{last:.6f}"))
+        return "\n".join(lines) + "\n"
+
+METRICS = Metrics()
+METRICS.describe("stage_seconds", "Time spent per ETL stage (dimensions, dates, extract, transform, load, warm)")
+METRICS.describe("batches_total", "ETL batches by outcome")
+METRICS.describe("errors_total", "ETL batch failures")
+METRICS.describe("rows_loaded_total", "Fact rows merged into fact_sales")
+METRICS.describe("facts_skipped_total", "Sales lines dropped because the product or customer key was missing")
+METRICS.describe("batch_rows", "Fact rows merged by the last batch")
+METRICS.describe("chunk_rows", "Fact rows per loaded chunk")
+METRICS.describe("dimension_rows_merged_total", "New or changed dimension rows merged")
+METRICS.describe("batch_rows_per_second", "Throughput of the last batch")
+METRICS.describe("freshness_lag_seconds", "Age of the oldest source order not yet in OLAP (0 when caught up)")
+METRICS.describe("pending_rows", "OrderItem rows past the watermark after the last batch (capped)")
+METRICS.describe("last_success_timestamp_seconds", "Unix time of the last successful batch")
+METRICS.describe("source_standby", "1 when the last batch extracted from the db_hot standby")
+METRICS.describe("source_standby_lag_seconds", "Replay lag of the standby when it was last checked")
+METRICS.describe("source_fallbacks_total", "Batches that fell back to the primary in standby mode")
+METRICS.describe("report_cache_warmed_total", "Report requests replayed through the reports API by the cache warmer")
+METRICS.describe("report_cache_warm_pending", "Requests the last warm-up pass had no budget left for")
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = METRICS.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass  # keep scrapes out of the ETL log
+
+def start_metrics_server(port=ETL_METRICS_PORT):
+    """Serves /metrics from a daemon thread. Returns the server, or None when disabled."""
+    if not port:
+        return None
+    server = ThreadingHTTPServer(("0.0.0.0", port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="etl-metrics", daemon=True).start()
+    print(f"Metrics on http://0.0.0.0:{port}/metrics")
+    return server
+
+_log_lock = threading.Lock()
+
+def log_event(event, **fields):
+    """Appends one JSON line to ETL_LOG_JSON (no-op when unset)."""
+    if not ETL_LOG_JSON:
+        return
+    line = json.dumps({"ts": time.strftime("%Y-%m-%dT%H:%M:%S%z"), "event": event, **fields}, default=str)
+    with _log_lock:
+        if ETL_LOG_JSON == "-":
+            print(line, flush=True)
+        else:
+            with open(ETL_LOG_JSON, "a") as f:
+                f.write(line + "\n")
@@ -0,0 +1,145 @@
+import queue
+import threading
+import time
+
+_DONE = object()
+
+class QueueGauge:
+    """Depth samples for one pipeline queue (taken on every put)."""
+
+    def __init__(self, name, q):
+        self.name = name
+        self.q = q
+        self.max_depth = 0
+        self.samples = 0
+        self.depth_total = 0
+        self.blocked_secs = 0.0  # time producers spent waiting on a full queue (backpressure)
+        self.lock = threading.Lock()  # several transform workers put into the same queue
+
+    def sample(self):
+        depth = self.q.qsize()
+        with self.lock:
+            self.max_depth = max(self.max_depth, depth)
+            self.samples += 1
+            self.depth_total += depth
+
+    def add_blocked(self, secs):
+        with self.lock:
+            self.blocked_secs += secs
+
+    def summary(self):
+        avg = self.depth_total / self.samples if self.samples else 0
+        return f"{self.name}: max {self.max_depth}/{self.q.maxsize}, avg {avg:.1f}, blocked {self.blocked_secs:.2f}s"
+
+def _put(gauge, item, stop):
+    """Blocking put that gives up once another stage has failed."""
+    start = time.perf_counter()
+    while not stop.is_set():
+        try:
+            gauge.q.put(item, timeout=0.1)
+            gauge.add_blocked(time.perf_counter() - start)
+            gauge.sample()
+            return True
+        except queue.Full:
+            continue
+    return False
+
+def run_pipeline(extract, transform, load, queue_depth=4, transform_workers=1):
+    """
+    Overlaps extraction, transformation and loading.
+
+      extract():        iterator of raw chunks (runs on a reader thread)
+      transform(chunk): mapped chunk (runs on transform_workers threads)
+      load(mapped):     rows loaded (runs on the calling thread, in extract order,
+                        so per-chunk commits such as the watermark stay monotonic)
+
+    Both queues are bounded by queue_depth, and a worker holds a finished chunk
+    until it is fewer than queue_depth chunks ahead of the next one to load, so
+    a slow loader (or one slow chunk) throttles the reader instead of buffering
+    the whole extract in memory. Re-raises the first error
+    from any stage. Returns (rows loaded, [gauge summaries]).
+    """
+    raw_q = queue.Queue(maxsize=queue_depth)
+    mapped_q = queue.Queue(maxsize=queue_depth)
+    raw_gauge = QueueGauge("extract->transform", raw_q)
+    mapped_gauge = QueueGauge("transform->load", mapped_q)
+    stop = threading.Event()
+    errors = []
+    # Next seq the loader needs; caps the loader's reorder buffer at queue_depth chunks
+    loaded = {"next_seq": 0}
+    loaded_cond = threading.Condition()
+
+    def wait_for_turn(seq):
+        start = time.perf_counter()
+        with loaded_cond:
+            while seq - loaded["next_seq"] >= queue_depth and not stop.is_set():
+                loaded_cond.wait(0.1)
+        mapped_gauge.add_blocked(time.perf_counter() - start)
+
+    def reader():
+        try:
+            for seq, chunk in enumerate(extract()):
+                if not _put(raw_gauge, (seq, chunk), stop):
+                    return
+        except Exception as e:
+            errors.append(e)
+            stop.set()
+        finally:
+            for _ in range(transform_workers):
+                _put(raw_gauge, _DONE, stop)
+
+    def transformer():
+        try:
+            while not stop.is_set():
+                try:
+                    item = raw_q.get(timeout=0.1)
+                except queue.Empty:
+                    continue
+                if item is _DONE:
+                    break
+                seq, chunk = item
+                mapped = transform(chunk)
+                wait_for_turn(seq)
+                if not _put(mapped_gauge, (seq, mapped), stop):
+                    return
+        except Exception as e:
+            errors.append(e)
+            stop.set()
+        finally:
+            _put(mapped_gauge, _DONE, stop)
+
+    threads = [threading.Thread(target=reader, name="etl-reader", daemon=True)]
+    threads += [threading.Thread(target=transformer, name=f"etl-transform-{i}", daemon=True)
+                for i in range(transform_workers)]
+    for t in threads:
+        t.start()
+
+    total = 0
+    pending = {}  # reorder buffer: transform workers may finish out of order
+    finished_workers = 0
+    try:
+        while finished_workers < transform_workers and not stop.is_set():
+            try:
+                item = mapped_q.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            if item is _DONE:
+                finished_workers += 1
+                continue
+            seq, mapped = item
+            pending[seq] = mapped
+            while loaded["next_seq"] in pending:
+                total += load(pending.pop(loaded["next_seq"]))
+                with loaded_cond:
+                    loaded["next_seq"] += 1
+                    loaded_cond.notify_all()
+    except Exception as e:
+        errors.append(e)
+    finally:
+        stop.set()
+        for t in threads:
+            t.join()
+
+    if errors:
+        raise errors[0]
+    return total, [raw_gauge.summary(), mapped_gauge.summary()]
@@ -0,0 +1,87 @@
+import os
+import time
+from collections import deque
+
+# Base interval between batches (the old fixed sleep)
+ETL_INTERVAL = int(os.getenv("ETL_INTERVAL", "60"))
+# Shortest pause while behind but not far behind, and longest pause when idle
+ETL_MIN_INTERVAL = int(os.getenv("ETL_MIN_INTERVAL", "5"))
+ETL_MAX_INTERVAL = int(os.getenv("ETL_MAX_INTERVAL", "600"))
+# Run back-to-back while this many lines are pending, or the oldest pending order is this old
+ETL_BEHIND_ROWS = int(os.getenv("ETL_BEHIND_ROWS", "10000"))
+ETL_BEHIND_LAG_SECS = int(os.getenv("ETL_BEHIND_LAG_SECS", "300"))
+# Max seconds of source query time per rolling minute
+ETL_SOURCE_BUDGET = float(os.getenv("ETL_SOURCE_BUDGET", "20"))
+
+BUDGET_WINDOW_SECS = 60
+
+class AdaptiveScheduler:
+    """
+    Picks the pause before the next ETL batch from the backlog the last batch
+    left behind:
+
+      far behind (rows or lag) -> 0s, run back-to-back
+      some pending rows        -> min_interval
+      batch loaded rows        -> interval
+      idle / failed            -> interval, doubling each time up to max_interval
+
+    Every decision is then stretched so source query time stays within
+    source_budget seconds per rolling minute.
+    """
+
+    def __init__(self, interval=ETL_INTERVAL, min_interval=ETL_MIN_INTERVAL, max_interval=ETL_MAX_INTERVAL,
+                 behind_rows=ETL_BEHIND_ROWS, behind_lag_secs=ETL_BEHIND_LAG_SECS, source_budget=ETL_SOURCE_BUDGET):
+        self.interval = interval
+        self.min_interval = min(min_interval, interval)
+        self.max_interval = max(max_interval, interval)
+        self.behind_rows = behind_rows
+        self.behind_lag_secs = behind_lag_secs
+        self.source_budget = source_budget
+        self.idle_delay = interval
+        self.source_usage = deque()  # (finished_at, source_secs) within the budget window
+
+    def record(self, source_secs, now=None):
+        now = time.time() if now is None else now
+        self.source_usage.append((now, source_secs))
+
+    def source_secs_used(self, now=None):
+        now = time.time() if now is None else now
+        while self.source_usage and now - self.source_usage[0][0] > BUDGET_WINDOW_SECS:
+            self.source_usage.popleft()
+        return sum(secs for _, secs in self.source_usage)
+
+    def budget_wait(self, now=None):
+        """Seconds until enough usage leaves the window to get back under budget."""
+        now = time.time() if now is None else now
+        over = self.source_secs_used(now) - self.source_budget
+        if over <= 0:
+            return 0.0
+        for finished_at, secs in self.source_usage:
+            over -= secs
+            if over <= 0:
+                return max(finished_at + BUDGET_WINDOW_SECS - now, 0.0)
+        return float(BUDGET_WINDOW_SECS)
+
+    def next_delay(self, ok, stats):
+        """Returns (seconds to sleep, reason)."""
+        pending = stats.get("pending_rows", 0)
+        lag = stats.get("lag_secs", 0)
+        self.record(stats.get("source_secs", 0.0))
+
+        if ok and (pending >= self.behind_rows or (pending and lag >= self.behind_lag_secs)):
+            delay, reason = 0, f"behind ({pending} rows pending, lag {lag:.0f}s)"
+            self.idle_delay = self.interval
+        elif ok and pending:
+            delay, reason = self.min_interval, f"catching up ({pending} rows pending)"
+            self.idle_delay = self.interval
+        elif ok and stats.get("rows_loaded"):
+            delay, reason = self.interval, "active"
+            self.idle_delay = self.interval
+        else:
+            delay, reason = self.idle_delay, "idle" if ok else "failed"
+            self.idle_delay = min(self.idle_delay * 2, self.max_interval)
+
+        wait = self.budget_wait()
+        if wait > delay:
+            delay, reason = wait, f"{reason}; source budget {self.source_budget:.0f}s/min used"
+        return delay, reason
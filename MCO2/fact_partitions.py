@@ -0,0 +1,171 @@
+import argparse
+import os
+from datetime import date
+import psycopg2
+
+PARENT = "fact_sales"
+DEFAULT_PARTITION = "fact_sales_default"
+# Stored columns of fact_sales (year / month are generated)
+FACT_COLUMNS = "sales_id, date_key, product_key, customer_key, order_id, quantity_sold, unit_price, total_revenue"
+
+# How many future months `ensure` keeps ready
+PARTITION_MONTHS_AHEAD = int(os.getenv("FACT_PARTITION_MONTHS_AHEAD", "3"))
+
+def month_start(d):
+    return date(d.year, d.month, 1)
+
+def add_months(d, months):
+    index = d.year * 12 + d.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+def partition_name(month):
+    return f"{PARENT}_p{month:%Y%m}"
+
+def bounds(month):
+    """date_key range [lo, hi) covered by one monthly partition."""
+    return int(f"{month:%Y%m%d}"), int(f"{add_months(month, 1):%Y%m%d}")
+
+def existing_partitions(cur):
+    """Names of the partitions currently attached to fact_sales."""
+    cur.execute("""
+        SELECT c.relname FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = %s::regclass
+    """, (PARENT,))
+    return {row[0] for row in cur.fetchall()}
+
+def _take_default_rows(cur, lo, hi):
+    """Moves rows for [lo, hi) out of the default partition into a temp table. Returns the count."""
+    cur.execute(f"""
+        CREATE TEMP TABLE _moved_facts ON COMMIT DROP AS
+        WITH moved AS (
+            DELETE FROM {DEFAULT_PARTITION} WHERE date_key >= %s AND date_key < %s
+            RETURNING {FACT_COLUMNS}
+        )
+        SELECT * FROM moved;
+    """, (lo, hi))
+    return cur.rowcount
+
+def create_partition(cur, month):
+    """
+    Creates the partition for one month. Rows that already landed in the default
+    partition are moved into it (writing to the partitions directly, so the
+    rollup triggers on fact_sales do not count them twice). Runs in the caller's
+    transaction; returns the number of rows moved.
+    """
+    name = partition_name(month)
+    lo, hi = bounds(month)
+    moved = _take_default_rows(cur, lo, hi)
+    cur.execute(f"CREATE TABLE {name} PARTITION OF {PARENT} FOR VALUES FROM ({lo}) TO ({hi});")
+    if moved:
+        cur.execute(f"INSERT INTO {name} ({FACT_COLUMNS}) SELECT {FACT_COLUMNS} FROM _moved_facts;")
+    cur.execute("DROP TABLE _moved_facts;")
+    return moved
+
+def ensure_partitions(cur, first, last):
+    """
+    Makes sure every month between first and last (dates) has its own partition.
+    Archived months are skipped (late rows for them stay in the default partition;
+    `attach` brings the archive back). Returns partitions created.
+    """
+    if first is None or last is None:
+        return 0
+    have = existing_partitions(cur)
+    cur.execute("SELECT month_start FROM fact_sales_archived_months")
+    archived = {row[0] for row in cur.fetchall()}
+    created = 0
+    month = month_start(first)
+    while month <= last:
+        if partition_name(month) not in have and month not in archived:
+            moved = create_partition(cur, month)
+            created += 1
+            print(f"   Created partition {partition_name(month)}" + (f" ({moved} rows moved from default)" if moved else ""))
+        month = add_months(month, 1)
+    return created
+
+def detach_before(cur, cutoff, drop=False):
+    """
+    Detaches monthly partitions that end on or before cutoff (a month start). Detached
+    tables are kept as standalone archives unless drop is set. The rollups and
+    fact_orders keep their totals; only line-level detail leaves fact_sales. Each
+    month is recorded in fact_sales_archived_months so rebuild_sales_rollups()
+    keeps those totals instead of recomputing them from the now missing lines.
+    """
+    detached = []
+    prefix = f"{PARENT}_p"
+    for name in sorted(existing_partitions(cur)):
+        if not (name.startswith(prefix) and name[len(prefix):].isdigit()):
+            continue  # default partition, or an attached table named differently
+        month = date(int(name[-6:-2]), int(name[-2:]), 1)
+        if add_months(month, 1) <= cutoff:
+            cur.execute(f"ALTER TABLE {PARENT} DETACH PARTITION {name};")
+            if drop:
+                cur.execute(f"DROP TABLE {name};")
+            cur.execute("""
+                INSERT INTO fact_sales_archived_months (month_start, date_key_lo, date_key_hi, table_name, dropped)
+                VALUES (%s, %s, %s, %s, %s)
+                ON CONFLICT (month_start) DO UPDATE SET
+                    table_name = EXCLUDED.table_name, dropped = EXCLUDED.dropped, detached_at = NOW();
+            """, (month, *bounds(month), name, drop))
+            detached.append(name)
+    return detached
+
+def attach(cur, table, month):
+    """
+    Re-attaches an archived table (e.g. one detached earlier) as the partition for
+    month; its lines count for rebuild_sales_rollups() again.
+    """
+    lo, hi = bounds(month)
+    moved = _take_default_rows(cur, lo, hi)
+    if moved:
+        cur.execute(f"""
+            INSERT INTO {table} ({FACT_COLUMNS}) SELECT {FACT_COLUMNS} FROM _moved_facts
+            ON CONFLICT DO NOTHING;
+        """)
+    cur.execute("DROP TABLE _moved_facts;")
+    cur.execute(f"ALTER TABLE {PARENT} ATTACH PARTITION {table} FOR VALUES FROM ({lo}) TO ({hi});")
+    cur.execute("DELETE FROM fact_sales_archived_months WHERE month_start = %s", (month,))
+    return moved
+
+def parse_month(text):
+    year, month = text.split("-")
+    return date(int(year), int(month), 1)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="fact_sales monthly partition maintenance")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_ensure = sub.add_parser("ensure", help="Create missing partitions from --from (default: this month) through --ahead months")
+    p_ensure.add_argument("--from", dest="start", type=parse_month, help="YYYY-MM")
+    p_ensure.add_argument("--ahead", type=int, default=PARTITION_MONTHS_AHEAD)
+
+    p_detach = sub.add_parser("detach", help="Detach partitions older than --keep-months")
+    p_detach.add_argument("--keep-months", type=int, required=True)
+    p_detach.add_argument("--drop", action="store_true", help="Drop the detached tables instead of keeping them")
+
+    p_attach = sub.add_parser("attach", help="Attach TABLE as the partition for MONTH")
+    p_attach.add_argument("table")
+    p_attach.add_argument("month", type=parse_month, help="YYYY-MM")
+
+    args = parser.parse_args()
+    from ETL import TARGET_CONFIG  # ETL.py imports this module, so not at the top
+    this_month = month_start(date.today())
+
+    conn = psycopg2.connect(**TARGET_CONFIG)
+    try:
+        cur = conn.cursor()
+        if args.command == "ensure":
+            created = ensure_partitions(cur, args.start or this_month, add_months(this_month, args.ahead))
+            print(f"{created} partitions created.")
+        elif args.command == "detach":
+            names = detach_before(cur, add_months(this_month, -args.keep_months), args.drop)
+            print(f"{'Dropped' if args.drop else 'Detached'} {len(names)} partitions: {', '.join(names) or '-'}")
+        else:
+            moved = attach(cur, args.table, args.month)
+            print(f"Attached {args.table} for {args.month:%Y-%m} ({moved} rows moved from default).")
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        print(f"Partition maintenance failed: {e}")
+    finally:
+        conn.close()
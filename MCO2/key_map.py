@@ -0,0 +1,150 @@
+import os
+from array import array
+from bisect import bisect_left
+
+# A dense map costs 8 bytes per OLTP id up to the largest one; if ids are sparser
+# than this (slots per mapped key), fall back to sorted arrays + bisect.
+KEY_MAP_MAX_SPARSITY = int(os.getenv("ETL_KEY_MAP_MAX_SPARSITY", "4"))
+# Surrogate keys below the highest loaded one that each refresh re-reads
+KEY_MAP_REFRESH_WINDOW = int(os.getenv("ETL_KEY_MAP_REFRESH_WINDOW", "1000"))
+
+class SurrogateKeyMap:
+    """
+    OLTP id -> surrogate key lookup for one dimension, kept across ETL cycles.
+
+    Keys live in an array('l') indexed by OLTP id (0 = not mapped) instead of a
+    dict of boxed ints. refresh() only reads dimension rows near or above the
+    highest surrogate key already loaded, since SERIAL keys only grow and
+    upserts keep the existing key.
+    """
+
+    def __init__(self, table, natural_key, surrogate_key, max_sparsity=KEY_MAP_MAX_SPARSITY,
+                 refresh_window=KEY_MAP_REFRESH_WINDOW):
+        self.table = table
+        self.natural_key = natural_key
+        self.surrogate_key = surrogate_key
+        self.max_sparsity = max_sparsity
+        self.refresh_window = refresh_window
+        self.hits = 0
+        self.misses = 0
+        self.missed = set()  # OLTP ids looked up without a key since the last refresh
+        self.refreshes = 0
+        self._reset()
+
+    def _reset(self):
+        self.dense = array("l")
+        # Sparse mode: parallel sorted arrays, used when ids are too spread out
+        self.sparse_ids = None
+        self.sparse_keys = None
+        self.count = 0
+        self.last_key = 0
+
+    def refresh(self, cur):
+        """
+        Loads keys created or changed since the last refresh. Returns the number of
+        entries added or updated.
+
+        SERIAL keys are handed out before commit, so concurrent dimension writers
+        can make a key visible after a higher one was already loaded. Each refresh
+        re-reads the last refresh_window keys to catch those, and also looks up
+        the OLTP ids that missed since the last refresh, so a late key further
+        back is picked up one cycle later (the ETL watermark waits for it).
+        """
+        cur.execute(f"SELECT COALESCE(MAX({self.surrogate_key}), 0) FROM {self.table}")
+        max_key = cur.fetchone()[0]
+        if max_key < self.last_key:
+            # Keys restarted (dimension truncated / schema rebuilt)
+            self._reset()
+
+        cur.execute(f"""
+            SELECT {self.natural_key}, {self.surrogate_key} FROM {self.table}
+            WHERE {self.surrogate_key} > %s AND {self.natural_key} IS NOT NULL
+            ORDER BY {self.surrogate_key}
+        """, (max(self.last_key - self.refresh_window, 0),))
+        found = dict(cur.fetchall())
+        if self.missed:
+            cur.execute(f"""
+                SELECT {self.natural_key}, {self.surrogate_key} FROM {self.table}
+                WHERE {self.natural_key} = ANY(%s)
+            """, (sorted(self.missed),))
+            found.update(cur.fetchall())
+            self.missed.clear()  # ids still orphaned are only re-checked if looked up again
+        rows = [(natural, key) for natural, key in found.items() if self._lookup(natural) != key]
+        self.refreshes += 1
+        if not rows:
+            return 0
+
+        self.last_key = max(self.last_key, max(key for _, key in rows))
+        self.count += sum(1 for natural, _ in rows if not self._lookup(natural))
+        if self.sparse_ids is None:
+            top = max(natural for natural, _ in rows)
+            if top + 1 <= self.max_sparsity * self.count + 1024:
+                self._add_dense(rows, top)
+                return len(rows)
+            self._to_sparse()
+        self._add_sparse(rows)
+        return len(rows)
+
+    def _add_dense(self, rows, top):
+        if top >= len(self.dense):
+            self.dense.extend([0] * (top + 1 - len(self.dense)))
+        for natural, key in rows:
+            self.dense[natural] = key
+
+    def _to_sparse(self):
+        pairs = [(natural, key) for natural, key in enumerate(self.dense) if key]
+        self.sparse_ids = array("l", (natural for natural, _ in pairs))
+        self.sparse_keys = array("l", (key for _, key in pairs))
+        self.dense = array("l")
+
+    def _add_sparse(self, rows):
+        rows = sorted(rows)
+        if not self.sparse_ids or rows[0][0] > self.sparse_ids[-1]:
+            # Usual case: new OLTP ids are above every existing one
+            self.sparse_ids.extend(natural for natural, _ in rows)
+            self.sparse_keys.extend(key for _, key in rows)
+            return
+        merged = dict(zip(self.sparse_ids, self.sparse_keys))
+        merged.update(rows)
+        merged = sorted(merged.items())
+        self.sparse_ids = array("l", (natural for natural, _ in merged))
+        self.sparse_keys = array("l", (key for _, key in merged))
+
+    def _lookup(self, natural):
+        """Mapped key, or 0. Does not count towards the hit / miss stats."""
+        if natural is None or natural < 0:
+            return 0
+        if self.sparse_ids is None:
+            return self.dense[natural] if natural < len(self.dense) else 0
+        i = bisect_left(self.sparse_ids, natural)
+        if i < len(self.sparse_ids) and self.sparse_ids[i] == natural:
+            return self.sparse_keys[i]
+        return 0
+
+    def get(self, natural, default=None):
+        """Surrogate key for an OLTP id, or default if the dimension has no row for it."""
+        key = self._lookup(natural)
+        if key:
+            self.hits += 1
+            return key
+        self.misses += 1
+        if natural is not None:
+            self.missed.add(natural)
+        return default
+
+    def memory_bytes(self):
+        if self.sparse_ids is None:
+            return self.dense.itemsize * len(self.dense)
+        return self.sparse_ids.itemsize * (len(self.sparse_ids) + len(self.sparse_keys))
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "keys": self.count,
+            "mode": "dense" if self.sparse_ids is None else "sparse",
+            "memory_bytes": self.memory_bytes(),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 1.0,
+            "refreshes": self.refreshes,
+        }
@@ -0,0 +1,48 @@
+import os
+import time
+import psycopg2
+
+from ETL import TARGET_CONFIG, bump_data_version
+
+# How many queued order events one drain_pending_sales() call claims
+DRAIN_BATCH = int(os.getenv("DRAIN_BATCH", "10000"))
+# Idle wait between polls once the queue is empty
+DRAIN_INTERVAL = float(os.getenv("DRAIN_INTERVAL", "1"))
+
+def drain_once(cur):
+    """
+    Drains the pending_sales queue until a pass merges nothing: the queue is empty,
+    held by another drainer, or only holds orders waiting for their dimensions
+    (those are retried on the next poll). Returns fact rows merged.
+    """
+    total = 0
+    while True:
+        cur.execute("SELECT drain_pending_sales(%s)", (DRAIN_BATCH,))
+        merged = cur.fetchone()[0]
+        cur.connection.commit()
+        if not merged:
+            if total:
+                bump_data_version(cur)
+                cur.connection.commit()
+            return total
+        total += merged
+
+def run_drain_loop():
+    conn = psycopg2.connect(**TARGET_CONFIG)
+    cur = conn.cursor()
+    print(f"Draining pending_sales every {DRAIN_INTERVAL}s (batch {DRAIN_BATCH}).")
+    try:
+        while True:
+            try:
+                merged = drain_once(cur)
+                if merged:
+                    print(f"Drained {merged} fact rows.")
+            except psycopg2.Error as e:
+                conn.rollback()
+                print(f"Drain failed: {e}")
+            time.sleep(DRAIN_INTERVAL)
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    run_drain_loop()
@@ -34,7 +34,7 @@ def execute_sql_file(db_name, filepath):
                     SELECT table_name 
                     FROM information_schema.tables 
                     WHERE table_schema = 'public' 
-                    AND table_name IN ('dim_date', 'dim_product', 'dim_customer', 'fact_sales');
+                    AND table_name IN ('dim_date', 'dim_product', 'dim_customer', 'fact_sales', 'fact_orders');
                 """)
                 tables = cur.fetchall()
                 print(f"   Verified tables: {[t[0] for t in tables]}")
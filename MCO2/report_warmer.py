@@ -0,0 +1,135 @@
+import argparse
+import json
+import os
+import time
+from urllib.parse import urlencode
+from urllib.request import Request, urlopen
+import psycopg2
+
+from ETL import TARGET_CONFIG
+from etl_metrics import METRICS
+
+# Reports API (backend/routes/reportRoutes.js); warming replays requests through it,
+# so the cached bodies are exactly what the routes return
+REPORT_API_URL = os.getenv("REPORT_API_URL", "http://backend:5001/api/reports").rstrip("/")
+# Seconds per warm-up pass; "0" disables the post-load stage in ETL.py
+REPORT_WARM_BUDGET = float(os.getenv("REPORT_WARM_BUDGET", "10"))
+# Max requests per pass: most requested combinations (report_cache_stats) first, then seeds
+REPORT_WARM_TOP = int(os.getenv("REPORT_WARM_TOP", "200"))
+# Requests older than this no longer count towards popularity
+REPORT_WARM_WINDOW_DAYS = int(os.getenv("REPORT_WARM_WINDOW_DAYS", "7"))
+# How long to wait for the API to see the new data version (it learns it via NOTIFY)
+REPORT_WARM_SYNC_SECS = float(os.getenv("REPORT_WARM_SYNC_SECS", "5"))
+
+# Marks warm-up requests so the API does not count them as demand
+WARM_HEADER = "X-Report-Warm"
+
+# Data version the last complete pass of this process warmed
+_warmed = {"version": None}
+
+def api_get(path, params=None, timeout=30):
+    url = f"{REPORT_API_URL}/{path}" + (f"?{urlencode(params)}" if params else "")
+    with urlopen(Request(url, headers={WARM_HEADER: "1"}), timeout=timeout) as resp:
+        return json.load(resp)
+
+def wait_for_api_version(version, timeout=REPORT_WARM_SYNC_SECS):
+    """True once the API caches results for version (or a newer one)."""
+    deadline = time.monotonic() + timeout
+    while True:
+        current = api_get("cache-stats").get("version")
+        if current is not None and int(current) >= version:
+            return True
+        if time.monotonic() >= deadline:
+            return False
+        time.sleep(0.2)
+
+def popular_combinations(cur, version, top=REPORT_WARM_TOP, window_days=REPORT_WARM_WINDOW_DAYS):
+    """(endpoint, params) requested most often within the window and not stored for version yet."""
+    cur.execute("""
+        SELECT s.endpoint, s.params FROM report_cache_stats s
+        WHERE s.last_requested_at > NOW() - make_interval(days => %s)
+          AND NOT EXISTS (SELECT 1 FROM report_cache c WHERE c.cache_key = s.cache_key AND c.version = %s)
+        ORDER BY s.hits + s.warm_hits + s.misses DESC
+        LIMIT %s
+    """, (window_days, version, top))
+    return cur.fetchall()
+
+def seed_combinations(filters):
+    """Dashboard defaults for when there are no stats yet: no filter, then one per year, set, rarity."""
+    queries = [{}]
+    queries += [{"year": year} for year in filters["years"]]
+    queries += [{"set": name} for name in filters["sets"]]
+    queries += [{"rarity": rarity} for rarity in filters["rarities"]]
+    for query in queries:
+        yield "summary", query
+        yield "revenue-trends", query
+        yield "sales-by-set", query
+        yield "top-products", {**query, "sortBy": "quantity"}
+        yield "top-products", {**query, "sortBy": "revenue"}
+
+def warm_report_cache(budget=REPORT_WARM_BUDGET, top=REPORT_WARM_TOP):
+    """
+    Requests /filters, the most requested combinations not yet stored for the
+    current olap_data_version, then the seed combinations built from /filters,
+    through the reports API until budget seconds are spent. The API stores what
+    it computes in report_cache. Returns (requests made, left for lack of budget).
+    """
+    started = time.perf_counter()
+    conn = psycopg2.connect(**TARGET_CONFIG)
+    try:
+        cur = conn.cursor()
+        cur.execute("SELECT version FROM olap_data_version")
+        version = cur.fetchone()[0]
+        conn.commit()
+        if _warmed["version"] == version:
+            return 0, 0
+        if not wait_for_api_version(version):
+            print(f"Report cache: API has not seen data version {version} yet; warming next time.")
+            return 0, 0
+
+        popular = popular_combinations(cur, version, top)
+        conn.commit()
+        filters = api_get("filters")
+        candidates = list(popular) + list(seed_combinations(filters))
+
+        requested = 1  # /filters
+        left = 0
+        seen = set()
+        for endpoint, params in candidates:
+            marker = (endpoint, json.dumps(params, sort_keys=True))
+            if marker in seen:
+                continue
+            seen.add(marker)
+            if requested >= top:
+                break
+            if time.perf_counter() - started >= budget:
+                left += 1
+                continue
+            api_get(endpoint, params)
+            requested += 1
+
+        cur.execute("DELETE FROM report_cache WHERE version < %s", (version,))
+        cur.execute("DELETE FROM report_cache_stats WHERE last_requested_at < NOW() - make_interval(days => %s)",
+                    (REPORT_WARM_WINDOW_DAYS,))
+        conn.commit()
+        if not left:
+            _warmed["version"] = version
+
+        METRICS.inc("report_cache_warmed_total", requested)
+        METRICS.set("report_cache_warm_pending", left)
+        return requested, left
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        METRICS.observe("stage_seconds", time.perf_counter() - started, stage="warm")
+        conn.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay popular report requests to fill report_cache")
+    parser.add_argument("--budget", type=float, default=REPORT_WARM_BUDGET, help="Seconds to spend")
+    parser.add_argument("--top", type=int, default=REPORT_WARM_TOP, help="Max requests per pass")
+    args = parser.parse_args()
+
+    requested, left = warm_report_cache(args.budget, args.top)
+    print(f"Warmed {requested} report requests ({left} left for lack of budget).")